@@ -1,5 +1,5 @@
 from django.contrib import admin
-from akamai.models import FileStorage, FileSystem, File, Directory
+from akamai.models import FileStorage, FileSystem, File, Directory, SyncRun, StoredContent, ContentAlias
 from polymorphic_tree.admin import PolymorphicMPTTParentModelAdmin, PolymorphicMPTTChildModelAdmin
 
 
@@ -41,3 +41,26 @@ class FileSystemAdmin(PolymorphicMPTTParentModelAdmin):
     )
 
     list_display = ('path', 'actions_column',)
+
+
+@admin.register(SyncRun)
+class SyncRunAdmin(admin.ModelAdmin):
+    list_display = ('storage', 'path', 'incremental', 'started', 'duration', 'dirs_listed', 'dirs_skipped',
+                    'created', 'updated', 'deleted', )
+    list_filter = ('storage', 'incremental', )
+    readonly_fields = list_display
+
+
+class ContentAliasInline(admin.TabularInline):
+    model = ContentAlias
+    readonly_fields = ('name', 'created', )
+    extra = 0
+
+
+@admin.register(StoredContent)
+class StoredContentAdmin(admin.ModelAdmin):
+    list_display = ('path', 'storage_key', 'size', 'digest', 'created', )
+    list_filter = ('storage_key', )
+    search_fields = ('path', 'digest', )
+    readonly_fields = list_display
+    inlines = (ContentAliasInline, )
@@ -0,0 +1,173 @@
+"""
+asyncio counterpart of AkamaiNetStorage, Python 3.5+ only.
+
+ftplib only speaks blocking sockets, so every operation runs on a thread
+pool owned by the storage and sized like its connection pool
+(POOL_MAX_SIZE). Any number of coroutines can await the storage at once:
+they queue for one of those threads instead of blocking the event loop,
+and share that many FTP connections.
+
+An open stream holds one of those connections until it is closed, its
+reads run on threads of their own so that they are never queued behind
+operations waiting for the connection it holds. At most POOL_MAX_SIZE - 1
+streams are open at once, open_stream() waits for one to be closed
+beyond: one connection is always left to the other operations, those of a
+coroutine holding a stream included. Waiting for a connection gives up after POOL_CHECKOUT_TIMEOUT
+seconds, CHECKOUT_TIMEOUT when it is not configured.
+"""
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+
+from akamai.storage import AkamaiNetStorage
+
+# Seconds to wait for a pooled connection when POOL_CHECKOUT_TIMEOUT is not set
+CHECKOUT_TIMEOUT = 60
+
+
+class AsyncAkamaiNetStorage(object):
+    """Awaitable Akamai NetStorage access, configured through FILE_STORAGES."""
+
+    def __init__(self, file_storage_key='default', loop=None):
+        # A storage, and so a connection pool, of its own
+        self._storage = AkamaiNetStorage(file_storage_key=file_storage_key)
+        pool = self._storage._pool
+        if pool.checkout_timeout is None:
+            pool.checkout_timeout = CHECKOUT_TIMEOUT
+        self._executor = ThreadPoolExecutor(max_workers=pool.max_size)
+        self._stream_executor = ThreadPoolExecutor(max_workers=pool.max_size)
+        # Created on first use, in the event loop it is used from
+        self._streams = None
+        self._loop = loop
+
+    def _get_loop(self):
+        return self._loop or asyncio.get_event_loop()
+
+    async def _run(self, func, *args, **kwargs):
+        return await self._get_loop().run_in_executor(self._executor, functools.partial(func, *args, **kwargs))
+
+    async def _run_stream(self, func, *args, **kwargs):
+        return await self._get_loop().run_in_executor(
+            self._stream_executor, functools.partial(func, *args, **kwargs))
+
+    async def save(self, name, content):
+        return await self._run(self._storage.save, name, content)
+
+    async def open(self, name, mode='rb'):
+        return await self._run(self._storage.open, name, mode)
+
+    async def open_stream(self, name, offset=0):
+        if self._streams is None:
+            # A connection left for the other operations
+            self._streams = asyncio.Semaphore(max(self._storage._pool.max_size - 1, 1))
+        await self._streams.acquire()
+        try:
+            stream = await self._run_stream(self._storage.open_stream, name, offset)
+        except:
+            self._streams.release()
+            raise
+        return AsyncStreamingFile(stream, self)
+
+    async def read_range(self, name, start, length):
+        return await self._run(self._storage.read_range, name, start, length)
+
+    async def exists(self, name):
+        return await self._run(self._storage.exists, name)
+
+    async def size(self, name):
+        return await self._run(self._storage.size, name)
+
+    async def listdir(self, path):
+        return await self._run(self._storage.listdir, path)
+
+    async def delete(self, name):
+        return await self._run(self._storage.delete, name)
+
+    async def accessed_time(self, name):
+        return await self._run(self._storage.accessed_time, name)
+
+    async def created_time(self, name):
+        return await self._run(self._storage.created_time, name)
+
+    async def modified_time(self, name):
+        return await self._run(self._storage.modified_time, name)
+
+    async def get_accessed_time(self, name):
+        return await self._run(self._storage.get_accessed_time, name)
+
+    async def get_created_time(self, name):
+        return await self._run(self._storage.get_created_time, name)
+
+    async def get_modified_time(self, name):
+        return await self._run(self._storage.get_modified_time, name)
+
+    def url(self, name):
+        # No network involved
+        return self._storage.url(name)
+
+    @property
+    def stats(self):
+        return self._storage.stats
+
+    async def close(self):
+        await self._run(self._storage.disconnect)
+        self._executor.shutdown(wait=False)
+        self._stream_executor.shutdown(wait=False)
+
+
+class AsyncStreamingFile(object):
+    """
+    Awaitable wrapper of AkamaiStreamingFile, for piping a remote file into an
+    asynchronous response chunk by chunk:
+
+        async with await storage.open_stream(name) as stream:
+            async for chunk in stream:
+                await send(chunk)
+
+    Close it once done, it counts against the open streams of the storage
+    until then.
+    """
+
+    chunk_size = 64 * 2 ** 10
+
+    def __init__(self, stream, storage):
+        self._stream = stream
+        self._storage = storage
+        self._closed = False
+
+    @property
+    def name(self):
+        return self._stream.name
+
+    async def read(self, size=-1):
+        return await self._storage._run_stream(self._stream.read, size)
+
+    async def seek(self, offset):
+        return await self._storage._run_stream(self._stream.seek, offset)
+
+    def tell(self):
+        return self._stream.tell()
+
+    async def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        try:
+            await self._storage._run_stream(self._stream.close)
+        finally:
+            self._storage._streams.release()
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        data = await self.read(self.chunk_size)
+        if not data:
+            raise StopAsyncIteration
+        return data
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.close()
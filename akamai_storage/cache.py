@@ -0,0 +1,402 @@
+import hashlib
+import os
+import tempfile
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from django.utils.encoding import force_bytes
+
+
+class LRUCache(object):
+    """
+    Thread safe in-process LRU mapping with an optional time to live.
+
+    ``ttl`` is the default lifetime of an entry in seconds, None keeps entries
+    until they are evicted by newer ones.
+    """
+
+    def __init__(self, max_size=1000, ttl=None):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            try:
+                value, expires = self._data.pop(key)
+            except KeyError:
+                return default
+            if expires is not None and expires < time.time():
+                return default
+            self._data[key] = (value, expires)
+            return value
+
+    def set(self, key, value, ttl=None):
+        if ttl is None:
+            ttl = self.ttl
+        expires = time.time() + ttl if ttl is not None else None
+        with self._lock:
+            self._data.pop(key, None)
+            self._data[key] = (value, expires)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def delete_matching(self, predicate):
+        with self._lock:
+            for key in [key for key in self._data if predicate(key)]:
+                del self._data[key]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __contains__(self, key):
+        return self.get(key, _missing) is not _missing
+
+    def __len__(self):
+        return len(self._data)
+
+
+_missing = object()
+
+
+class DirectoryCache(object):
+    """
+    Remote directories confirmed to exist, so they are not probed or created
+    again for every file written below them.
+    """
+
+    def __init__(self, max_size=10000, ttl=None):
+        self._cache = LRUCache(max_size=max_size, ttl=ttl)
+
+    def add(self, path):
+        if path:
+            self._cache.set(path, True)
+
+    def add_tree(self, path):
+        """Record path and all of its parents."""
+        while path:
+            self._cache.set(path, True)
+            path = path.rpartition('/')[0]
+
+    def discard(self, path):
+        """Forget path and everything below it."""
+        prefix = path.rstrip('/') + '/'
+        self._cache.delete_matching(lambda key: key == path or key.startswith(prefix))
+
+    def clear(self):
+        self._cache.clear()
+
+    def __contains__(self, path):
+        return path in self._cache
+
+
+class MetadataCache(object):
+    """
+    Cache of remote object metadata (exists, size, listdir, times) in front of
+    a storage, kept either in process or in one of Django's caches.
+
+    ``timeouts`` maps a kind of metadata to its lifetime in seconds and falls
+    back to ``timeout`` for kinds it does not mention.
+    """
+
+    missing = _missing
+    kinds = ('exists', 'size', 'listdir', 'modified_time', 'created_time')
+
+    def __init__(self, prefix, backend='locmem', cache_alias='default', max_entries=10000,
+                 timeout=300, timeouts=None):
+        self.prefix = prefix
+        self.timeout = timeout
+        self.timeouts = timeouts or {}
+        if backend == 'django':
+            from django.core.cache import caches
+            self._django_cache = caches[cache_alias]
+            self._local_cache = None
+        elif backend == 'locmem':
+            self._django_cache = None
+            self._local_cache = LRUCache(max_size=max_entries)
+        else:
+            raise ValueError('Unknown metadata cache backend: %s' % backend)
+
+    @classmethod
+    def from_config(cls, prefix, config):
+        return cls(
+            prefix,
+            backend=config.get('BACKEND', 'locmem'),
+            cache_alias=config.get('CACHE_ALIAS', 'default'),
+            max_entries=config.get('MAX_ENTRIES', 10000),
+            timeout=config.get('TIMEOUT', 300),
+            timeouts=config.get('TIMEOUTS'),
+        )
+
+    def get(self, kind, name):
+        if self._local_cache is not None:
+            return self._local_cache.get((kind, name), _missing)
+        return self._django_cache.get(self._key(kind, name), _missing)
+
+    def set(self, kind, name, value):
+        timeout = self.timeouts.get(kind, self.timeout)
+        if self._local_cache is not None:
+            self._local_cache.set((kind, name), value, ttl=timeout)
+        else:
+            self._django_cache.set(self._key(kind, name), value, timeout)
+
+    def invalidate(self, name):
+        """
+        Forget everything cached about name, and the listings and existence
+        of its parents which a write or delete of name can change.
+        """
+        keys = [(kind, name) for kind in self.kinds]
+        parent = name
+        while parent:
+            parent = parent.rpartition('/')[0]
+            keys.append(('listdir', parent))
+            if parent:
+                keys.append(('exists', parent))
+
+        if self._local_cache is not None:
+            for key in keys:
+                self._local_cache.delete(key)
+        else:
+            self._django_cache.delete_many([self._key(kind, path) for kind, path in keys])
+
+    def clear(self):
+        if self._local_cache is not None:
+            self._local_cache.clear()
+        else:
+            # Shared caches can not be cleared per storage, let entries expire
+            pass
+
+    def _key(self, kind, name):
+        # Hashed, remote names can be longer than memcached keys allow
+        digest = hashlib.md5(force_bytes(name)).hexdigest()
+        return 'akamai:{}:{}:{}'.format(self.prefix, kind, digest)
+
+
+class ChoicesCache(object):
+    """
+    Choices listed for the form fields of one storage, in one of Django's
+    caches so that they are shared with, and invalidated by, every process
+    using that cache, like akamai_sync.
+
+    Shared caches can not delete keys by pattern, so the key of a listing
+    carries version tokens instead: one of the storage, one of every
+    directory from the root down to the listed path, and one of the changes
+    below the listed path. invalidate() replaces the tokens a change of
+    path affects, the listings built on the old ones are never read again
+    and expire.
+    """
+
+    def __init__(self, storage_key, cache_alias='default'):
+        from django.core.cache import caches
+        self.storage_key = storage_key
+        self._cache = caches[cache_alias]
+
+    def get(self, path, params):
+        return self._cache.get(self._key(path, params))
+
+    def set(self, path, params, choices, timeout):
+        self._cache.set(self._key(path, params), choices, timeout)
+
+    def invalidate(self, path=None):
+        """
+        Forget the listings of path, of the directories above it and of
+        those below it. Every listing of the storage without path.
+        """
+        if path is None:
+            keys = [self._version_key('storage', '')]
+        else:
+            # Changed itself, and changed below each of its parents
+            keys = [self._version_key('path', path), self._version_key('below', path)]
+            parent = path
+            while parent:
+                parent = parent.rpartition('/')[0]
+                keys.append(self._version_key('below', parent))
+        self._cache.set_many(dict((key, uuid.uuid4().hex) for key in keys), None)
+
+    def _key(self, path, params):
+        # Listings below path change with path and every directory above it
+        version_keys = [self._version_key('storage', ''), self._version_key('below', path)]
+        parent = path
+        while True:
+            version_keys.append(self._version_key('path', parent))
+            if not parent:
+                break
+            parent = parent.rpartition('/')[0]
+
+        versions = self._cache.get_many(version_keys)
+        missing = dict((key, uuid.uuid4().hex) for key in version_keys if key not in versions)
+        if missing:
+            # Never set or evicted, a new token also retires what was cached
+            # with the old one
+            self._cache.set_many(missing, None)
+            versions.update(missing)
+
+        parts = [repr((path, ) + tuple(params))] + [versions[key] for key in version_keys]
+        digest = hashlib.md5(force_bytes('\n'.join(parts))).hexdigest()
+        return 'akamai:{}:choices:{}'.format(self.storage_key, digest)
+
+    def _version_key(self, kind, path):
+        digest = hashlib.md5(force_bytes(path)).hexdigest()
+        return 'akamai:{}:choices-version:{}:{}'.format(self.storage_key, kind, digest)
+
+
+class DiskCache(object):
+    """
+    Local copies of remote objects in ``directory``, evicted least recently
+    used first once they take more than ``max_bytes``. Objects larger than
+    ``max_object_bytes`` are not copied.
+
+    A copy is keyed by the name, size and modification time of the object,
+    so a changed object is never served from an outdated copy. The index is
+    kept in memory and rebuilt from the directory on start; processes
+    sharing a directory each keep to their own budget.
+    """
+
+    def __init__(self, directory, max_bytes=2 ** 30, max_object_bytes=None):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_object_bytes = max_object_bytes or max_bytes
+        self._entries = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        self._load()
+
+    @classmethod
+    def from_config(cls, config):
+        return cls(
+            config['DIR'],
+            max_bytes=config.get('MAX_BYTES', 2 ** 30),
+            max_object_bytes=config.get('MAX_OBJECT_BYTES'),
+        )
+
+    def get(self, name, size, mtime):
+        """Path of the copy of this version of name, or None."""
+        path = self._path(name, size, mtime)
+        with self._lock:
+            if path not in self._entries:
+                return None
+            self._entries[path] = self._entries.pop(path)
+        if not os.path.exists(path):
+            # Evicted by another process
+            self._forget([path])
+            return None
+        return path
+
+    def put(self, name, size, mtime, write):
+        """
+        Copy this version of name through write(file) and return the path of
+        the copy, or None when it is too large to cache.
+        """
+        if size > self.max_object_bytes:
+            return None
+        path = self._path(name, size, mtime)
+        directory = os.path.dirname(path)
+        if not os.path.isdir(directory):
+            try:
+                os.makedirs(directory)
+            except OSError:
+                if not os.path.isdir(directory):
+                    raise
+
+        # Written aside and renamed, readers never see a partial copy
+        fd, temp_path = tempfile.mkstemp(suffix='.part', dir=directory)
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                write(f)
+            os.rename(temp_path, path)
+        except:
+            os.remove(temp_path)
+            raise
+
+        self.discard(name, keep=path)
+        with self._lock:
+            self._size -= self._entries.pop(path, 0)
+            self._entries[path] = os.path.getsize(path)
+            self._size += self._entries[path]
+            evicted = []
+            while self._size > self.max_bytes and len(self._entries) > 1:
+                evicted_path, evicted_size = self._entries.popitem(last=False)
+                self._size -= evicted_size
+                evicted.append(evicted_path)
+        self._remove(evicted)
+        return path
+
+    def discard(self, name, keep=None):
+        """Remove every copy of name, except the one at keep."""
+        digest = self._digest(name)
+        directory = os.path.join(self.directory, digest[:2])
+        try:
+            files = os.listdir(directory)
+        except OSError:
+            return
+        paths = [
+            os.path.join(directory, filename)
+            for filename in files
+            if filename.startswith(digest + '-')
+        ]
+        paths = [path for path in paths if path != keep]
+        self._forget(paths)
+        self._remove(paths)
+
+    def clear(self):
+        with self._lock:
+            paths = list(self._entries)
+            self._entries.clear()
+            self._size = 0
+        self._remove(paths)
+
+    @property
+    def size(self):
+        return self._size
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _forget(self, paths):
+        with self._lock:
+            for path in paths:
+                self._size -= self._entries.pop(path, 0)
+
+    def _remove(self, paths):
+        for path in paths:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def _load(self):
+        if not os.path.isdir(self.directory):
+            try:
+                os.makedirs(self.directory)
+            except OSError:
+                if not os.path.isdir(self.directory):
+                    raise
+        found = []
+        for directory, _, files in os.walk(self.directory):
+            for filename in files:
+                path = os.path.join(directory, filename)
+                if filename.endswith('.part'):
+                    # Left over by an interrupted copy
+                    self._remove([path])
+                    continue
+                stat = os.stat(path)
+                found.append((stat.st_atime, path, stat.st_size))
+        # Least recently used first, as far as access times tell
+        for _, path, size in sorted(found):
+            self._entries[path] = size
+            self._size += size
+
+    def _path(self, name, size, mtime):
+        digest = self._digest(name)
+        version = '%d-%s' % (size, mtime.strftime('%Y%m%d%H%M%S%f'))
+        return os.path.join(self.directory, digest[:2], '%s-%s' % (digest, version))
+
+    def _digest(self, name):
+        return hashlib.sha1(force_bytes(name)).hexdigest()
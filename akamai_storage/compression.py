@@ -0,0 +1,89 @@
+"""
+Streaming encoders for the pre-compressed variants of saved files.
+
+brotli is optional, install the brotli package to write '.br' variants.
+"""
+import zlib
+from tempfile import SpooledTemporaryFile
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+# Suffix of the variant for each Content-Encoding
+SUFFIXES = {
+    'br': '.br',
+    'gzip': '.gz',
+}
+
+DEFAULT_EXTENSIONS = ('.css', '.csv', '.html', '.js', '.json', '.map', '.svg', '.txt', '.xml')
+
+
+class GzipEncoder(object):
+    def __init__(self, level=9):
+        # 16 + MAX_WBITS: gzip header and trailer around the deflate stream
+        self._compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def compress(self, data):
+        return self._compressor.compress(data)
+
+    def flush(self):
+        return self._compressor.flush()
+
+
+class BrotliEncoder(object):
+    def __init__(self, quality=9):
+        self._compressor = brotli.Compressor(quality=quality)
+
+    def compress(self, data):
+        return self._compressor.process(data)
+
+    def flush(self):
+        return self._compressor.finish()
+
+
+class VariantWriter(object):
+    """
+    Encode the data passed to write(), chunk by chunk, into a buffer that
+    stays in memory up to max_memory bytes and is spooled to disk beyond,
+    so that memory use does not grow with the size of the original.
+    """
+
+    def __init__(self, encoding, encoder, max_memory):
+        self.encoding = encoding
+        self.suffix = SUFFIXES[encoding]
+        self.file = SpooledTemporaryFile(max_size=max_memory, suffix=self.suffix)
+        self._encoder = encoder
+
+    def write(self, data):
+        self.file.write(self._encoder.compress(data))
+
+    def finish(self):
+        """Flush the encoder and return the size of the variant."""
+        self.file.write(self._encoder.flush())
+        size = self.file.tell()
+        self.file.seek(0)
+        return size
+
+    def close(self):
+        self.file.close()
+
+
+def parse_accept_encoding(header):
+    """Content-Encodings of an Accept-Encoding header the client accepts."""
+    accepted = set()
+    for part in (header or '').split(','):
+        coding, _, params = part.strip().partition(';')
+        quality = 1.0
+        for param in params.split(';'):
+            key, _, value = param.strip().partition('=')
+            if key == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if coding and quality > 0:
+            accepted.add(coding.strip().lower())
+    return accepted
@@ -0,0 +1,69 @@
+import sys
+import threading
+from django.utils.six.moves import queue
+
+
+def ordered_map(func, iterable, workers, window=None):
+    """
+    Apply func to every item of iterable on a number of worker threads and
+    yield (item, result, error) tuples in the order of iterable.
+
+    At most ``window`` items (twice the workers by default) are read ahead of
+    the consumer, so a slow consumer holds back the producer and memory stays
+    flat for arbitrarily long iterables. An exception raised by func is
+    returned as the error of its item instead of stopping the other items.
+    """
+    workers = max(1, workers)
+    window = max(workers, window or workers * 2)
+    tasks = queue.Queue()
+    results = queue.Queue()
+
+    def work():
+        while True:
+            task = tasks.get()
+            if task is None:
+                return
+            index, item = task
+            try:
+                results.put((index, item, func(item), None))
+            except Exception:
+                results.put((index, item, None, sys.exc_info()[1]))
+
+    threads = [threading.Thread(target=work) for _ in range(workers)]
+    for thread in threads:
+        thread.daemon = True
+        thread.start()
+
+    iterator = iter(iterable)
+    submitted = 0
+    next_index = 0
+    done = {}
+    exhausted = False
+    try:
+        while True:
+            while not exhausted and submitted - next_index < window:
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    exhausted = True
+                    break
+                tasks.put((submitted, item))
+                submitted += 1
+
+            if exhausted and next_index == submitted:
+                return
+
+            while next_index not in done:
+                index, item, result, error = results.get()
+                done[index] = (item, result, error)
+            yield done.pop(next_index)
+            next_index += 1
+    finally:
+        # Drop work not started yet when the consumer stops early
+        try:
+            while True:
+                tasks.get_nowait()
+        except queue.Empty:
+            pass
+        for _ in threads:
+            tasks.put(None)
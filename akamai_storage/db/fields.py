@@ -1,11 +1,154 @@
 from __future__ import unicode_literals
+import posixpath
+import threading
+from contextlib import contextmanager
+
+from akamai.concurrency import ordered_map
 from akamai.forms.fields import AkamaiFilePathField as AkamaiFilePathFormField
+from akamai.listing import normalize
 from akamai.utils import get_storage_class
 from django.core import exceptions
 from django.db.models.fields import TextField
 from django.utils.translation import ugettext_lazy as _
 
 
+# Directory contents shared inside validation_batch(), by (storage_key, directory),
+# and the objects holding the content of dedup aliases, by (storage_key, name)
+_batch = threading.local()
+
+
+@contextmanager
+def validation_batch():
+    """
+    Share the existence checks of AkamaiFilePathField values within the
+    block, so that validating many values lists each directory only once:
+
+        with validation_batch():
+            for instance in instances:
+                instance.full_clean()
+
+    A storage whose FILE_STORAGES config sets VALIDATION_SOURCE to 'db' is
+    checked against its synced FileSystem rows instead of the server.
+    """
+    if getattr(_batch, 'directories', None) is not None:
+        # Nested, the outer block owns the results
+        yield
+        return
+    _batch.directories = {}
+    _batch.aliases = {}
+    try:
+        yield
+    finally:
+        _batch.directories = None
+        _batch.aliases = None
+
+
+def prefetch_paths(storage_key, names, concurrency=None):
+    """
+    Read the directories of names for the current validation_batch() ahead
+    of validation, listing several at once. Does nothing outside a batch.
+    """
+    directories = getattr(_batch, 'directories', None)
+    if directories is None:
+        return
+    storage = get_storage_class(storage_key)
+    names = [name for name in names if name]
+    if getattr(storage, '_dedup', None) is not None:
+        # Aliases are checked where their content is
+        aliases = _batch.aliases
+        unresolved = [name for name in names if (storage_key, name) not in aliases]
+        resolved = storage._dedup.resolve_many(unresolved)
+        for name in unresolved:
+            aliases[storage_key, name] = resolved.get(name, name)
+        names = [aliases[storage_key, name] for name in names]
+    missing = set(posixpath.dirname(normalize(name)) for name in names)
+    missing = [directory for directory in missing if (storage_key, directory) not in directories]
+    if not missing:
+        return
+
+    if _validates_with_db(storage):
+        for directory, listed in _db_listings(storage_key, missing).items():
+            directories[storage_key, directory] = listed
+        return
+    if not hasattr(storage, '_listed_names'):
+        # Not an Akamai storage, path_exists() checks one name at a time
+        return
+
+    for directory, listed, error in ordered_map(storage._listed_names, missing, storage._bulk_workers(concurrency)):
+        # A failed listing is retried, and reported, by path_exists()
+        if error is None:
+            directories[storage_key, directory] = listed
+
+
+def path_exists(storage_key, name):
+    """Whether name exists on the storage, or in its synced rows."""
+    storage = get_storage_class(storage_key)
+    from_db = _validates_with_db(storage)
+    directories = getattr(_batch, 'directories', None)
+    if directories is None and not from_db:
+        return storage.exists(name)
+    path = normalize(_resolve(storage_key, storage, name)) if name else ''
+
+    if directories is None or not path:
+        if from_db:
+            return not path or _db_rows(storage_key).filter(path=path).exists()
+        return storage.exists(name)
+
+    directory = posixpath.dirname(path)
+    listed = directories.get((storage_key, directory))
+    if listed is None:
+        if from_db:
+            listed = _db_listings(storage_key, [directory])[directory]
+        else:
+            try:
+                listed = storage._listed_names(directory)
+            except Exception:
+                # Missing directory, failed listing or not an Akamai storage,
+                # exists() tells
+                return storage.exists(name)
+        directories[storage_key, directory] = listed
+    return posixpath.basename(path) in listed
+
+
+def _resolve(storage_key, storage, name):
+    """Name of the object holding the content of name, a dedup alias or not."""
+    if getattr(storage, '_dedup', None) is None:
+        return name
+    aliases = getattr(_batch, 'aliases', None)
+    if aliases is None:
+        return storage._resolve(name)
+    if (storage_key, name) not in aliases:
+        aliases[storage_key, name] = storage._resolve(name)
+    return aliases[storage_key, name]
+
+
+def _validates_with_db(storage):
+    # Storages other than AkamaiNetStorage (the default one) have no config
+    return getattr(storage, '_config', {}).get('VALIDATION_SOURCE', 'storage') == 'db'
+
+
+def _db_rows(storage_key):
+    # akamai.models imports this module
+    from akamai.models import FileSystem
+    return FileSystem.objects.non_polymorphic().filter(storage__config_name=storage_key)
+
+
+def _db_listings(storage_key, directories, batch_size=500):
+    """Names of the synced rows directly in each directory, by directory."""
+    listings = dict((directory, set()) for directory in directories)
+    queryset = _db_rows(storage_key)
+    if '' in listings:
+        for path in queryset.filter(parent__isnull=True).values_list('path', flat=True):
+            listings[''].add(path)
+    parents = [directory for directory in directories if directory]
+    for start in range(0, len(parents), batch_size):
+        rows = queryset.filter(parent__path__in=parents[start:start + batch_size]).values_list('path', flat=True)
+        for path in rows:
+            directory, _, name = path.rpartition('/')
+            listings[directory].add(name)
+    return listings
+
+
 class AkamaiFilePathField(TextField):
     description = _("Akamai file path")
 
@@ -47,9 +190,7 @@ class AkamaiFilePathField(TextField):
         if not self.blank and value in self.empty_values:
             raise exceptions.ValidationError(self.error_messages['blank'], code='blank')
 
-        # find storage
-        storage = get_storage_class('default')
-        if not storage.exists(value):
+        if not path_exists(self.storage_key or 'default', value):
             raise exceptions.ValidationError(
                 self.error_messages['invalid_choice'],
                 code='invalid_choice',
@@ -0,0 +1,113 @@
+"""
+Index of the content saved through a storage by digest, for the DEDUP mode
+of AkamaiNetStorage.
+
+A name saved with the content of an object the index knows becomes an alias
+of it, a ContentAlias row, instead of a copy on the server. Reads of the
+alias go to that object.
+"""
+import hashlib
+
+from django.db import transaction
+
+
+class DedupIndex(object):
+    """
+    StoredContent and ContentAlias rows of one storage. Remote operations are
+    left to the storage, this only keeps the rows.
+    """
+
+    def __init__(self, storage_key, algorithm='sha256', min_size=1024):
+        self.storage_key = storage_key
+        self.algorithm = algorithm
+        # Not worth a lookup below it; empty files are never deduplicated
+        self.min_size = max(min_size, 1)
+        hashlib.new(algorithm)
+
+    @classmethod
+    def from_config(cls, storage_key, config):
+        return cls(
+            storage_key,
+            algorithm=config.get('ALGORITHM', 'sha256'),
+            min_size=config.get('MIN_SIZE', 1024),
+        )
+
+    def digest(self, file, chunk_size):
+        """
+        (digest, size) of the rest of file, which is rewound to where it was,
+        or (None, None) when it can not be.
+        """
+        try:
+            start = file.tell()
+        except (AttributeError, IOError, ValueError):
+            return None, None
+        digest = hashlib.new(self.algorithm)
+        size = 0
+        while True:
+            data = file.read(chunk_size)
+            if not data:
+                break
+            digest.update(data)
+            size += len(data)
+        file.seek(start)
+        return '{}:{}'.format(self.algorithm, digest.hexdigest()), size
+
+    def lookup(self, digest):
+        """StoredContent with digest, or None."""
+        from akamai.models import StoredContent
+        return StoredContent.objects.filter(storage_key=self.storage_key, digest=digest).first()
+
+    def record(self, digest, size, name):
+        """name now holds the content with digest."""
+        from akamai.models import StoredContent
+        with transaction.atomic():
+            updated = StoredContent.objects.filter(storage_key=self.storage_key, digest=digest).update(
+                size=size, path=name)
+            if not updated:
+                StoredContent.objects.create(storage_key=self.storage_key, digest=digest, size=size, path=name)
+
+    def add_alias(self, name, content):
+        from akamai.models import ContentAlias
+        ContentAlias.objects.create(content=content, name=name)
+
+    def remove_alias(self, name):
+        """True when name was an alias."""
+        from akamai.models import ContentAlias
+        aliases = ContentAlias.objects.filter(content__storage_key=self.storage_key, name=name)
+        if not aliases.exists():
+            return False
+        aliases.delete()
+        return True
+
+    def held(self, name):
+        """
+        StoredContent held by the object name and the first of its aliases,
+        (None, None) when the index does not know name.
+        """
+        from akamai.models import StoredContent
+        content = StoredContent.objects.filter(storage_key=self.storage_key, path=name).first()
+        if content is None:
+            return None, None
+        return content, content.aliases.order_by('pk').first()
+
+    def promote(self, content, alias):
+        """The object of content was moved to the name of alias."""
+        with transaction.atomic():
+            content.path = alias.name
+            content.save(update_fields=['path'])
+            alias.delete()
+
+    def forget(self, content):
+        content.delete()
+
+    def resolve(self, name):
+        """Name of the object holding the content of name."""
+        return self.resolve_many([name]).get(name, name)
+
+    def resolve_many(self, names):
+        """Objects holding the content of the aliases among names, by name."""
+        from akamai.models import ContentAlias
+        return dict(ContentAlias.objects.filter(
+            content__storage_key=self.storage_key,
+            name__in=names,
+        ).values_list('name', 'content__path'))
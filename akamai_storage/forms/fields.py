@@ -1,52 +1,189 @@
 from __future__ import unicode_literals
 
+import posixpath
 import re
 
+from akamai.cache import ChoicesCache
+from akamai.forms.widgets import AkamaiPathAutocomplete
+from akamai.listing import normalize
 from akamai.storage import AkamaiNetStorage
 from akamai.utils import get_storage_class
+from django.conf import settings
 from django.core.exceptions import ImproperlyConfigured
 from django.core.files import storage as django_storage
 from django.forms import fields
 
 
+def _choices_cache(storage_key):
+    """
+    ChoicesCache of a storage, in the Django cache its CHOICES_CACHE_ALIAS
+    names ('default' by default).
+    """
+    config = getattr(settings, 'FILE_STORAGES', {}).get(storage_key, {})
+    return ChoicesCache(storage_key, config.get('CHOICES_CACHE_ALIAS', 'default'))
+
+
+def invalidate_choices(storage_key=None, path=None):
+    """
+    Forget cached choices of a storage, or of every storage by default. With
+    path only the choices listing path, a directory above it or one below it
+    are dropped.
+    """
+    if path is not None:
+        path = normalize(path)
+    if storage_key is None:
+        storage_keys = list(getattr(settings, 'FILE_STORAGES', {}))
+    else:
+        storage_keys = [storage_key]
+    for key in storage_keys:
+        _choices_cache(key).invalidate(path)
+
+
+def get_choices(storage, storage_key, path='', match=None, recursive=False, allow_files=True,
+                allow_folders=False, source='storage'):
+    """
+    Sorted file and/or directory names below path, cached for the storage's
+    CHOICES_CACHE_TTL seconds (300 by default), see _choices_cache(). Non
+    recursive choices are names, recursive ones paths.
+
+    source='db' reads them from the FileSystem rows of the storage, see
+    akamai.sync, instead of listing the server.
+    """
+    path = normalize(path)
+    params = (recursive, match, allow_files, allow_folders, source)
+    cache = _choices_cache(storage_key)
+    choices = cache.get(path, params)
+    if choices is not None:
+        return choices
+
+    if source == 'db':
+        names = _db_names(storage_key, path, recursive, allow_files, allow_folders)
+    elif source == 'storage':
+        dirs, files = storage._get_dir_details(path, recursive=recursive, show_folders=allow_folders,
+                                               show_files=allow_files)
+        names = list(dirs) + list(files)
+    else:
+        raise ImproperlyConfigured('Unknown AkamaiFilePathField source: %r' % source)
+
+    if match is not None:
+        match_re = re.compile(match)
+        names = [name for name in names if match_re.search(name)]
+
+    choices = [(name, name) for name in sorted(names)]
+    cache.set(path, params, choices, storage._config.get('CHOICES_CACHE_TTL', 300))
+    return choices
+
+
+def _db_names(storage_key, path, recursive, allow_files, allow_folders):
+    paths = db_paths(storage_key, path, recursive, allow_files, allow_folders)
+    if recursive:
+        return list(paths)
+    return [posixpath.basename(name) for name in paths]
+
+
+def db_paths(storage_key, path, recursive=False, allow_files=True, allow_folders=False):
+    """
+    Paths of the synced FileSystem rows below path, as a values_list. The
+    choice of a row is its path when recursive, its basename otherwise.
+    """
+    # akamai.models imports the model field, which imports this module
+    from akamai.models import Directory, File, FileSystem
+    from django.contrib.contenttypes.models import ContentType
+
+    models = []
+    if allow_files:
+        models.append(File)
+    if allow_folders:
+        models.append(Directory)
+
+    queryset = FileSystem.objects.non_polymorphic().filter(
+        storage__config_name=storage_key,
+        polymorphic_ctype__in=[ContentType.objects.get_for_model(model, for_concrete_model=False) for model in models],
+    )
+    if recursive:
+        if path:
+            queryset = queryset.filter(path__startswith=path + '/')
+    elif path:
+        queryset = queryset.filter(parent__path=path)
+    else:
+        queryset = queryset.filter(parent__isnull=True)
+    return queryset.values_list('path', flat=True)
+
+
+class LazyChoices(object):
+    """Choices of a field, looked up the first time they are iterated."""
+
+    def __init__(self, field):
+        self.field = field
+
+    def __iter__(self):
+        return iter(self.field.choices)
+
+    def __len__(self):
+        return len(self.field.choices)
+
+
 class AkamaiFilePathField(fields.ChoiceField):
     def __init__(self, path='', match=None, recursive=False, allow_files=True,
                  allow_folders=False, required=True, widget=None, label=None,
-                 initial=None, help_text='', storage_key=None, storage_field=None, *args, **kwargs):
+                 initial=None, help_text='', storage_key=None, storage_field=None,
+                 source='storage', *args, **kwargs):
 
         self.path, self.match, self.recursive = path, match, recursive
         self.allow_files, self.allow_folders = allow_files, allow_folders
         self.storage_key, self.storage_field = storage_key, storage_field
+        self.source = source
 
         super(AkamaiFilePathField, self).__init__(choices=(), required=required,
             widget=widget, label=label, initial=initial, help_text=help_text,
             *args, **kwargs)
 
         if storage_key:
-            storage = get_storage_class(storage_key)
+            self.storage = get_storage_class(storage_key)
         elif storage_field:
-            storage = django_storage.default_storage
+            self.storage = django_storage.default_storage
         else:
-            storage = django_storage.default_storage
+            self.storage = django_storage.default_storage
 
-        if storage.__class__ != AkamaiNetStorage:
+        if self.storage.__class__ != AkamaiNetStorage:
             raise ImproperlyConfigured('AkamaiFilePathField only works with AkamaiNetStorage storage.')
 
-        if self.required:
-            self.choices = []
-        else:
-            self.choices = [("", "---------")]
+        # Nothing is listed until the choices are used
+        self._choices = None
+        self.widget.choices = LazyChoices(self)
 
-        storage._start_connection()
-        dirs, files = storage._get_dir_details(path, recursive=recursive, show_folders=allow_folders, show_files=allow_files)
+        if isinstance(self.widget, AkamaiPathAutocomplete):
+            self.widget.search_params = {
+                'storage_key': self.storage_key or 'default',
+                'path': normalize(self.path),
+                'match': self.match,
+                'recursive': self.recursive,
+                'allow_files': self.allow_files,
+                'allow_folders': self.allow_folders,
+                'source': self.source,
+            }
 
-        lines = sorted(dirs.keys() + files.keys(), key=str)
+    def __deepcopy__(self, memo):
+        result = super(AkamaiFilePathField, self).__deepcopy__(memo)
+        result.widget.choices = LazyChoices(result)
+        return result
 
-        if self.match is not None:
-            self.match_re = re.compile(self.match)
+    def _get_choices(self):
+        if self._choices is None:
+            choices = [] if self.required else [("", "---------")]
+            self._choices = choices + get_choices(
+                self.storage,
+                self.storage_key or 'default',
+                self.path,
+                match=self.match,
+                recursive=self.recursive,
+                allow_files=self.allow_files,
+                allow_folders=self.allow_folders,
+                source=self.source,
+            )
+        return self._choices
 
-        for line in lines:
-            if self.match is None or self.match_re.search(line):
-                self.choices.append((line, line))
+    def _set_choices(self, value):
+        self._choices = self.widget.choices = list(value)
 
-        self.widget.choices = self.choices
+    choices = property(_get_choices, _set_choices)
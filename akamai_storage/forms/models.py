@@ -1,3 +1,4 @@
+from akamai.db.fields import AkamaiFilePathField, prefetch_paths, validation_batch
 from django.forms.models import BaseModelForm, ErrorList, model_to_dict
 
 
@@ -34,3 +35,32 @@ class AkamaiBaseModelForm(BaseModelForm):
                     if callable(limit_choices_to):
                         limit_choices_to = limit_choices_to()
                     formfield.queryset = formfield.queryset.complex_filter(limit_choices_to)
+
+
+class AkamaiFilePathFormSetMixin(object):
+    """
+    Mixin for model formsets validating the AkamaiFilePathField values of
+    all their forms together, with one listing per directory instead of a
+    check per form:
+
+        class ImageFormSet(AkamaiFilePathFormSetMixin, BaseModelFormSet):
+            pass
+    """
+
+    def full_clean(self):
+        with validation_batch():
+            self._prefetch_paths()
+            super(AkamaiFilePathFormSetMixin, self).full_clean()
+
+    def _prefetch_paths(self):
+        if not self.is_bound or getattr(self, 'model', None) is None:
+            return
+        for field in self.model._meta.fields:
+            if not isinstance(field, AkamaiFilePathField):
+                continue
+            values = [
+                form[field.name].value()
+                for form in self.forms
+                if field.name in form.fields
+            ]
+            prefetch_paths(field.storage_key or 'default', [value for value in values if value])
@@ -0,0 +1,36 @@
+from __future__ import unicode_literals
+
+from django.core import signing
+from django.core.urlresolvers import reverse
+from django.forms import widgets
+from django.utils.html import format_html
+
+
+SEARCH_SALT = 'akamai.path_search'
+
+
+class AkamaiPathAutocomplete(widgets.TextInput):
+    """
+    Text input suggesting paths as they are typed, fetched page by page from
+    the akamai_path_search view instead of rendering every choice in a
+    <select>. Use it as the widget of a forms AkamaiFilePathField, which
+    fills in search_params; include akamai.urls in the URLconf.
+    """
+
+    search_params = None
+
+    class Media:
+        js = ('akamai/js/path_autocomplete.js', )
+
+    def render(self, name, value, attrs=None, **kwargs):
+        final_attrs = dict(attrs or {})
+        list_id = '%s_paths' % final_attrs.get('id', name)
+        final_attrs.update({
+            'autocomplete': 'off',
+            'list': list_id,
+            'data-akamai-search': reverse('akamai_path_search'),
+            # Signed, the view must not run a match pattern of the browser
+            'data-akamai-field': signing.dumps(self.search_params, salt=SEARCH_SALT, compress=True),
+        })
+        html = super(AkamaiPathAutocomplete, self).render(name, value, final_attrs, **kwargs)
+        return html + format_html('<datalist id="{0}"></datalist>', list_id)
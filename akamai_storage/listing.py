@@ -0,0 +1,242 @@
+import posixpath
+from collections import namedtuple
+from datetime import datetime, timedelta
+
+
+# One object of a directory listing. type is 'file', 'dir', 'link' or 'other',
+# mtime a naive datetime (UTC for MLSD, server time for LIST) or None and path
+# the name joined to the directory it was listed in.
+Entry = namedtuple('Entry', ('type', 'size', 'mtime', 'name', 'path'))
+
+MONTHS = {
+    'jan': 1, 'feb': 2, 'mar': 3, 'apr': 4, 'may': 5, 'jun': 6,
+    'jul': 7, 'aug': 8, 'sep': 9, 'oct': 10, 'nov': 11, 'dec': 12,
+}
+
+LIST_TYPES = {
+    '-': 'file',
+    'd': 'dir',
+    'l': 'link',
+}
+
+MLSD_TYPES = {
+    'file': 'file',
+    'dir': 'dir',
+    'os.unix=slink': 'link',
+    'os.unix=symlink': 'link',
+}
+
+
+def parse_facts(facts):
+    """
+    Parse MLST/MLSD facts ("type=file;size=5;modify=20141026120000;") into
+    a dict with lower cased names.
+    """
+    parsed = {}
+    for fact in facts.split(';'):
+        key, sep, value = fact.partition('=')
+        if sep:
+            parsed[key.strip().lower()] = value
+    return parsed
+
+
+def parse_time(value):
+    """
+    Parse an MDTM/MLST timestamp (YYYYMMDDHHMMSS[.sss], UTC) into a naive
+    UTC datetime.
+    """
+    value, _, fraction = value.strip().partition('.')
+    parsed = datetime.strptime(value, '%Y%m%d%H%M%S')
+    if fraction:
+        parsed = parsed.replace(microsecond=int(fraction[:6].ljust(6, '0')))
+    return parsed
+
+
+def _parse_fast_time(value):
+    # strptime is by far the slowest part of parsing a large MLSD listing
+    try:
+        return datetime(int(value[0:4]), int(value[4:6]), int(value[6:8]),
+                        int(value[8:10]), int(value[10:12]), int(value[12:14]))
+    except ValueError:
+        return None
+
+
+# Objects in one listing tend to share timestamps, parse each only once
+_TIME_CACHE_SIZE = 10000
+
+
+class ListParser(object):
+    """
+    Incremental parser of Unix style LIST output, including the directory
+    headers of LIST -R. Feed it lines one at a time through parse().
+
+    Owner and group may contain any character but whitespace, and servers
+    that leave out the group column are understood as well. "Time or year"
+    dates are placed in the most recent year that is not in the future.
+
+    The list sections, a new one unless given, collects the directories
+    whose LIST -R header was parsed, in order. A directory listed in its
+    parent without a section of its own was left out of the output, its
+    contents are unknown.
+    """
+
+    def __init__(self, path='', now=None, sections=None):
+        self.current_path = normalize(path)
+        self.sections = [] if sections is None else sections
+        now = now or datetime.utcnow()
+        self._year = now.year
+        # A day of slack for servers in another timezone
+        self._limit = now + timedelta(days=1)
+        self._times = {}
+
+    def parse(self, line):
+        """Entry for line, or None for headers, totals and blank lines."""
+        line = line.rstrip('\r\n')
+        if not line:
+            return None
+        parts = line.split(None, 8)
+        if not is_mode(parts[0]):
+            if line.endswith(':'):
+                # LIST -R header of the next directory
+                self.current_path = normalize(line[:-1])
+                self.sections.append(self.current_path)
+            return None
+
+        if len(parts) == 9 and parts[5][:3].lower() in MONTHS:
+            size, month, day, time_or_year, name = parts[4:9]
+        else:
+            # No group column
+            parts = line.split(None, 7)
+            if len(parts) != 8 or parts[4][:3].lower() not in MONTHS:
+                return None
+            size, month, day, time_or_year, name = parts[3:8]
+
+        entry_type = LIST_TYPES.get(line[0], 'other')
+        if entry_type == 'link':
+            name = name.partition(' -> ')[0]
+        if name in ('.', '..'):
+            return None
+
+        try:
+            size = int(size)
+        except ValueError:
+            return None
+
+        key = (month, day, time_or_year)
+        try:
+            mtime = self._times[key]
+        except KeyError:
+            if len(self._times) >= _TIME_CACHE_SIZE:
+                self._times.clear()
+            mtime = self._times[key] = self._mtime(month, day, time_or_year)
+
+        return Entry(entry_type, size, mtime, name, join(self.current_path, name))
+
+    def _mtime(self, month, day, time_or_year):
+        try:
+            month = MONTHS[month[:3].lower()]
+            day = int(day)
+            if ':' in time_or_year:
+                hour, _, minute = time_or_year.partition(':')
+                mtime = datetime(self._year, month, day, int(hour), int(minute))
+                if mtime > self._limit:
+                    mtime = mtime.replace(year=self._year - 1)
+                return mtime
+            return datetime(int(time_or_year), month, day)
+        except ValueError:
+            return None
+
+
+class MLSDParser(object):
+    """Incremental parser of MLSD output, see RFC 3659."""
+
+    def __init__(self, path=''):
+        self.current_path = normalize(path)
+        self._times = {}
+
+    def parse(self, line):
+        """Entry for line, or None for the current and parent directory."""
+        line = line.rstrip('\r\n')
+        facts, sep, name = line.partition(' ')
+        if not sep or not name:
+            return None
+        facts = parse_facts(facts)
+        # Symbolic links may come with their target, OS.unix=slink:/target
+        entry_type = facts.get('type', '').lower().partition(':')[0]
+        if entry_type in ('cdir', 'pdir'):
+            return None
+        try:
+            size = int(facts.get('size', 0))
+        except ValueError:
+            size = 0
+        modify = facts.get('modify')
+        try:
+            mtime = self._times[modify]
+        except KeyError:
+            if len(self._times) >= _TIME_CACHE_SIZE:
+                self._times.clear()
+            mtime = self._times[modify] = _parse_fast_time(modify) if modify else None
+        return Entry(
+            MLSD_TYPES.get(entry_type, 'other'),
+            size,
+            mtime,
+            name,
+            join(self.current_path, name),
+        )
+
+
+def facts_entry(facts, path):
+    """Entry of the object at path from its MLST facts, as MLSD lists it."""
+    path = normalize(path)
+    entry_type = facts.get('type', '').lower().partition(':')[0]
+    try:
+        size = int(facts.get('size', 0))
+    except ValueError:
+        size = 0
+    modify = facts.get('modify')
+    return Entry(
+        MLSD_TYPES.get(entry_type, 'other'),
+        size,
+        _parse_fast_time(modify) if modify else None,
+        posixpath.basename(path),
+        path,
+    )
+
+
+def iter_list(lines, path='', now=None, sections=None):
+    """
+    Parse LIST or LIST -R lines into Entry records as they come in. The
+    directories of the LIST -R headers are appended to the list sections,
+    when given, as they are parsed.
+    """
+    parse = ListParser(path, now, sections).parse
+    for line in lines:
+        entry = parse(line)
+        if entry is not None:
+            yield entry
+
+
+def iter_mlsd(lines, path=''):
+    """Parse MLSD lines into Entry records as they come in."""
+    parse = MLSDParser(path).parse
+    for line in lines:
+        entry = parse(line)
+        if entry is not None:
+            yield entry
+
+
+def is_mode(token):
+    """True for a Unix mode column like drwxr-xr-x (optionally with + or @)."""
+    return 10 <= len(token) <= 11 and token[0] in '-dlbcps' and not token[1:10].strip('rwxsStTl-')
+
+
+def normalize(path):
+    """Remote path without leading slash or dot components, '' for the root."""
+    path = posixpath.normpath(path.replace('\\', '/')).lstrip('/')
+    return '' if path == '.' else path
+
+
+def join(directory, name):
+    if not directory:
+        return name
+    return directory + '/' + name
@@ -0,0 +1,174 @@
+import json
+import os
+import time
+from optparse import make_option
+
+from akamai.listing import normalize
+from akamai.sync import TreeSync
+from django.core.management.base import BaseCommand, CommandError
+
+
+USAGE = '<storage_key> [path]'
+
+# Flags and keyword arguments of the options, for argparse and optparse alike
+OPTIONS = (
+    ('--batch-size', dict(type=int, default=500,
+                          help='Rows written per query (default 500).')),
+    ('--concurrency', dict(type=int, default=None,
+                           help='Parallel listings of an incremental sync, at most POOL_MAX_SIZE.')),
+    ('--incremental', dict(action='store_true', default=False,
+                           help='Only list directories whose mtime changed since the last sync.')),
+    ('--dry-run', dict(action='store_true', default=False,
+                       help='Count the changes without writing them.')),
+    ('--checkpoint', dict(default=None,
+                          help='JSON file recording finished directories, to resume an interrupted sync.')),
+    ('--checkpoint-every', dict(type=int, default=10000,
+                                help='Entries a full sync writes between two checkpoints (default 10000).')),
+)
+
+
+class Command(BaseCommand):
+    help = (
+        'Mirror a NetStorage tree into the File and Directory tables. The '
+        'directories directly below path are synced one at a time, and with '
+        '--checkpoint an interrupted sync resumes after the last one finished. '
+        'A full sync also records the directories it wrote inside the one in '
+        'progress, and lists none of them again.'
+    )
+
+    if not hasattr(BaseCommand, 'add_arguments'):
+        # Django before 1.8 only parses options with optparse
+        args = USAGE
+        option_list = BaseCommand.option_list + tuple(make_option(flag, **kwargs) for flag, kwargs in OPTIONS)
+
+    # Entries between two progress lines
+    progress_every = 10000
+
+    def add_arguments(self, parser):
+        parser.add_argument('storage_key')
+        parser.add_argument('path', nargs='?', default='')
+        for flag, kwargs in OPTIONS:
+            parser.add_argument(flag, **kwargs)
+
+    def handle(self, *args, **options):
+        if 'storage_key' in options:
+            args = (options['storage_key'], options['path'])
+        if not 1 <= len(args) <= 2:
+            raise CommandError('Usage: akamai_sync %s' % USAGE)
+        storage_key = args[0]
+        path = normalize(args[1] if len(args) > 1 else '')
+        self.verbosity = int(options.get('verbosity', 1))
+        incremental = options['incremental']
+        dry_run = options['dry_run']
+
+        self.started = time.time()
+        # Entries listed by finished syncs
+        self.total = 0
+        self.offset = 0
+        self.sync = TreeSync(
+            storage_key,
+            batch_size=options['batch_size'],
+            concurrency=options['concurrency'],
+            dry_run=dry_run,
+            # Once at the end instead of after every directory
+            rebuild_tree=False,
+            progress=self._progress,
+            step_size=options['checkpoint_every'],
+        )
+        checkpoint_file = None if dry_run else options['checkpoint']
+        checkpoint = self._load_checkpoint(checkpoint_file, storage_key, path)
+        done = set(checkpoint['done'])
+        if done or checkpoint['synced']:
+            self._log('Resuming from %s, %d directories already synced' % (
+                checkpoint_file, len(done) + len(checkpoint['synced'])))
+
+        # The entries of path itself first, so that removed directories are
+        # deleted and new ones get a parent row
+        entries = self.sync.list(path, recursive=False)
+        result = self.sync.run(path, recursive=False, entries=entries)
+        self.total += result.listed
+        if not done and not checkpoint['synced']:
+            # Counted before the interruption
+            self._count(checkpoint, result)
+        units = sorted(name for name, entry in entries.items() if entry.type == 'dir' and name not in done)
+
+        try:
+            for index, unit in enumerate(units, 1):
+                self.offset = self.total
+                if checkpoint_file and not incremental:
+                    def step(directories, result):
+                        self._count(checkpoint, result)
+                        checkpoint['synced'].extend(directories)
+                        self._save_checkpoint(checkpoint_file, checkpoint)
+
+                    result = self.sync.run(unit, recursive=True, step=step, synced=checkpoint['synced'])
+                else:
+                    result = self.sync.run(unit, recursive=True, incremental=incremental)
+                    self._count(checkpoint, result)
+                self.total += result.listed
+                checkpoint['done'].append(unit)
+                # The directories synced inside unit, all of them now
+                checkpoint['synced'] = []
+                self._save_checkpoint(checkpoint_file, checkpoint)
+                self._log('[%d/%d] %s: %d entries, %d created, %d updated, %d deleted, %s' % (
+                    index, len(units), unit, result.listed, result.created, result.updated,
+                    result.deleted, self._rate()))
+        except KeyboardInterrupt:
+            if not dry_run:
+                # Left stale by the finished directories, which are not synced again
+                self._log('Rebuilding the tree')
+                self.sync.rebuild()
+            if checkpoint_file:
+                raise CommandError('Interrupted, run again with --checkpoint %s to resume' % checkpoint_file)
+            raise CommandError('Interrupted')
+
+        if not dry_run:
+            self._log('Rebuilding the tree')
+            self.sync.rebuild()
+        if checkpoint_file and os.path.exists(checkpoint_file):
+            os.remove(checkpoint_file)
+
+        self.stdout.write('%s%d entries, %d created, %d updated, %d deleted, %s' % (
+            'Dry run: ' if dry_run else '', checkpoint['listed'], checkpoint['created'], checkpoint['updated'],
+            checkpoint['deleted'], self._rate()))
+
+    def _progress(self, listed):
+        if listed % self.progress_every == 0:
+            self._log('  %d entries listed, %s' % (self.offset + listed, self._rate(self.offset + listed)), level=2)
+
+    def _rate(self, total=None):
+        elapsed = max(time.time() - self.started, 0.001)
+        return '%.0f entries/sec' % ((self.total if total is None else total) / elapsed)
+
+    def _count(self, checkpoint, result):
+        for field in ('listed', 'created', 'updated', 'deleted'):
+            checkpoint[field] += getattr(result, field)
+
+    def _log(self, message, level=1):
+        if self.verbosity >= level:
+            self.stdout.write(message)
+
+    def _load_checkpoint(self, checkpoint_file, storage_key, path):
+        checkpoint = {'storage': storage_key, 'path': path, 'done': [], 'synced': [],
+                      'listed': 0, 'created': 0, 'updated': 0, 'deleted': 0}
+        if not checkpoint_file or not os.path.exists(checkpoint_file):
+            return checkpoint
+        with open(checkpoint_file) as f:
+            try:
+                saved = json.load(f)
+            except ValueError:
+                raise CommandError('%s is not a checkpoint file' % checkpoint_file)
+        if saved.get('storage') != storage_key or saved.get('path') != path:
+            raise CommandError('%s is the checkpoint of another sync (%s, %r)' % (
+                checkpoint_file, saved.get('storage'), saved.get('path')))
+        checkpoint.update(saved)
+        return checkpoint
+
+    def _save_checkpoint(self, checkpoint_file, checkpoint):
+        if not checkpoint_file:
+            return
+        # Replace in one go, an interrupt must not leave half a file
+        temp_file = checkpoint_file + '.tmp'
+        with open(temp_file, 'w') as f:
+            json.dump(checkpoint, f)
+        os.rename(temp_file, checkpoint_file)
@@ -1,7 +1,6 @@
 from __future__ import unicode_literals
 
 import os
-import re
 
 from akamai.db.fields import AkamaiFilePathField
 from akamai.utils import get_storage_class
@@ -15,83 +14,14 @@ from polymorphic import PolymorphicManager
 
 class FileSystemManager(PolymorphicManager):
 
-    ls_line = re.compile('^(?P<directory>[-d])(?P<permissions>[-r][-w][-x][-r][-w][-x][-r][-w][-x]) {1,}(?P<links>\d+) {1,}(?P<owner>[\w_]{0,30}) {1,}(?P<group>[\w_]{0,30}) {1,}(?P<size>\d+) {1,}(?P<lastmod_month>\w+) {1,}(?P<lastmod_day>\d+) {1,}(?P<lastmod_time_or_year>\d{2}:?\d{2}) {1,}(?P<filename>.+)$')
-
-    def retreive(self, storage_key, path, recursive=True):
-        storage = get_storage_class(storage_key)
-        lines = storage._get_dir_extra_details(path, recursive)
-
-        items = []
-
-        current_path = path
-        stor = FileStorage.objects.get(config_name=storage_key)
-
-        for line in lines:
-            print '-'* 25
-            if not line:
-                print '<blank>'
-                # blank line
-                continue
-            elif line.endswith(":"):
-                # switch current directory
-                current_path = line[:-1]
-                print 'switch to "{}"'.format(current_path)
-                continue
-            ln = self._split_line(line)
-            print ln
-
-            if ln['directory'] == 'd':
-                item = self._cache_directory(stor, current_path, ln)
-            else:
-                item = self._cache_file(stor, current_path, ln)
-            items.append(item)
-
-    def _split_line(self, line):
-        return self.ls_line.match(line).groupdict()
-
-    def _cache_directory(self, storage, current_path, ln):
-        print current_path, ln['filename']
-        if not current_path:
-            path = ln['filename']
-        else:
-            path = os.path.normpath('/'.join([current_path, ln['filename']]))
-        print path
-        try:
-            directory = Directory.objects.get(storage=storage, path=path)
-        except:
-            directory = Directory()
-            directory.storage = storage
-            directory.parent = self._get_directory(storage, current_path)
-            directory.path = path
-            directory.name = ln['filename']
-            directory.save()
-        return directory
-
-    def _cache_file(self, storage, current_path, ln):
-        print current_path, ln['filename']
-        if not current_path:
-            path = ln['filename']
-        else:
-            path = os.path.normpath('/'.join([current_path, ln['filename']]))
-        name, ext = os.path.splitext(ln['filename'])
-        print path, name, ext
-        try:
-            file = File.objects.get(storage=storage, path=path)
-        except:
-            file = File()
-            file.storage = storage
-            file.parent = self._get_directory(storage, current_path)
-            file.path = path
-            file.name = name
-            file.file_ext = ext[1:].lower()
-            file.save()
-        return file
-
-    def _get_directory(self, storage, path):
-        print '_get_directory("{}","{}")'.format(storage.config_name, path)
-        if path:
-            return Directory.objects.get(storage=storage, path=path)
-        return None
+    def retreive(self, storage_key, path, recursive=True, incremental=False):
+        """
+        Mirror the listing of path into File and Directory rows, see
+        akamai.sync.TreeSync.
+        """
+        # akamai.sync needs the models below
+        from akamai.sync import TreeSync
+        return TreeSync(storage_key).run(path, recursive, incremental)
 
 
 @python_2_unicode_compatible
@@ -124,7 +54,8 @@ class FileSystem(PolymorphicMPTTModel, TimeStampedModel):
 
     # DB Fields
     storage = models.ForeignKey(FileStorage)
-    path = AkamaiFilePathField(_('path'), max_length=2048, allow_files=True, allow_folders=True)
+    # Indexed for the prefix searches of the path autocomplete
+    path = AkamaiFilePathField(_('path'), max_length=2048, allow_files=True, allow_folders=True, db_index=True)
     parent = PolymorphicTreeForeignKey('self', null=True, blank=True, related_name='children')
 
     objects = FileSystemManager()
@@ -170,6 +101,67 @@ class Directory(FileSystem):
     # DB Fields
     name = models.CharField(_('name'), max_length=140, blank=True, null=True)
 
+    # Fingerprint of the last listing, an incremental sync skips the
+    # directory while its mtime in the parent listing stays the same
+    mtime = models.DateTimeField(_('modified'), blank=True, null=True, editable=False)
+    entry_count = models.PositiveIntegerField(_('entries'), blank=True, null=True, editable=False)
+    size_sum = models.BigIntegerField(_('size of files'), blank=True, null=True, editable=False)
+
     class Meta:
         verbose_name = _('directory')
         verbose_name_plural = _('directories')
+
+
+@python_2_unicode_compatible
+class SyncRun(models.Model):
+    storage = models.ForeignKey(FileStorage, related_name='sync_runs')
+    path = models.CharField(_('path'), max_length=2048, blank=True)
+    incremental = models.BooleanField(_('incremental'), default=False)
+    started = models.DateTimeField(_('started'))
+    duration = models.FloatField(_('duration (s)'))
+    dirs_listed = models.PositiveIntegerField(_('directories listed'), default=0)
+    dirs_skipped = models.PositiveIntegerField(_('directories skipped'), default=0)
+    created = models.PositiveIntegerField(_('created'), default=0)
+    updated = models.PositiveIntegerField(_('updated'), default=0)
+    deleted = models.PositiveIntegerField(_('deleted'), default=0)
+
+    def __str__(self):
+        return '{} /{} {}'.format(self.storage, self.path, self.started)
+
+    class Meta:
+        verbose_name = _('sync run')
+        verbose_name_plural = _('sync runs')
+        ordering = ('-started', )
+
+
+@python_2_unicode_compatible
+class StoredContent(models.Model):
+    """Remote object holding the content with digest, see akamai.dedup."""
+    storage_key = models.CharField(_('storage key'), max_length=140)
+    digest = models.CharField(_('digest'), max_length=160)
+    size = models.BigIntegerField(_('size'))
+    path = models.CharField(_('path'), max_length=2048, db_index=True)
+    created = models.DateTimeField(_('created'), auto_now_add=True)
+
+    def __str__(self):
+        return self.path
+
+    class Meta:
+        verbose_name = _('stored content')
+        verbose_name_plural = _('stored contents')
+        unique_together = (('storage_key', 'digest'), )
+
+
+@python_2_unicode_compatible
+class ContentAlias(models.Model):
+    """Name saved with the content of an existing remote object."""
+    content = models.ForeignKey(StoredContent, related_name='aliases')
+    name = models.CharField(_('name'), max_length=2048, db_index=True)
+    created = models.DateTimeField(_('created'), auto_now_add=True)
+
+    def __str__(self):
+        return self.name
+
+    class Meta:
+        verbose_name = _('content alias')
+        verbose_name_plural = _('content aliases')
@@ -0,0 +1,106 @@
+import threading
+import time
+
+
+class ConnectionPoolTimeout(Exception):
+    pass
+
+
+class ConnectionPool(object):
+    """
+    Bounded pool of FTP connections for a single NetStorage configuration.
+
+    Connections are created on demand by ``factory`` up to ``max_size``.
+    Checked in connections that sat idle for longer than ``idle_timeout``
+    seconds are closed instead of being handed out again. Liveness is
+    tracked passively from the last time a connection was used: only a
+    connection idle for more than ``probe_after`` seconds is handed to
+    ``probe`` before reuse, and dropped if the probe returns False.
+    """
+
+    def __init__(self, factory, max_size=4, idle_timeout=60, checkout_timeout=None,
+                 probe=None, probe_after=None):
+        self._factory = factory
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self.checkout_timeout = checkout_timeout
+        self._probe = probe
+        self.probe_after = probe_after
+        self._idle = []
+        self._size = 0
+        self._condition = threading.Condition(threading.Lock())
+
+    def checkout(self):
+        deadline = None
+        if self.checkout_timeout is not None:
+            deadline = time.time() + self.checkout_timeout
+
+        while True:
+            connection, idle_for = self._reserve(deadline)
+            if connection is None:
+                break
+            if self._probe is None or self.probe_after is None or idle_for <= self.probe_after:
+                return connection
+            if self._probe(connection):
+                return connection
+            self.checkin(connection, discard=True)
+
+        # Connect outside of the lock, other threads may keep checking in
+        try:
+            return self._factory()
+        except:
+            with self._condition:
+                self._size -= 1
+                self._condition.notify()
+            raise
+
+    def _reserve(self, deadline):
+        """
+        Take an idle connection, or reserve room for a new one and return None.
+        """
+        with self._condition:
+            while True:
+                while self._idle:
+                    connection, last_used = self._idle.pop()
+                    idle_for = time.time() - last_used
+                    if self.idle_timeout is not None and idle_for > self.idle_timeout:
+                        self._size -= 1
+                        self._close(connection)
+                        continue
+                    return connection, idle_for
+
+                if self._size < self.max_size:
+                    self._size += 1
+                    return None, 0
+
+                if deadline is None:
+                    self._condition.wait()
+                else:
+                    remaining = deadline - time.time()
+                    if remaining <= 0:
+                        raise ConnectionPoolTimeout('No NetStorage connection available after %s seconds' % self.checkout_timeout)
+                    self._condition.wait(remaining)
+
+    def checkin(self, connection, discard=False):
+        with self._condition:
+            if discard:
+                self._size -= 1
+                self._close(connection)
+            else:
+                self._idle.append((connection, time.time()))
+            self._condition.notify()
+
+    def clear(self):
+        """Close every idle connection. Checked out connections are left alone."""
+        with self._condition:
+            while self._idle:
+                connection, last_used = self._idle.pop()
+                self._size -= 1
+                self._close(connection)
+            self._condition.notify_all()
+
+    def _close(self, connection):
+        try:
+            connection.close()
+        except Exception:
+            pass
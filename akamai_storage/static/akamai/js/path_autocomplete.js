@@ -0,0 +1,73 @@
+/*
+ * Suggestions for AkamaiPathAutocomplete inputs: the first page of matching
+ * paths is fetched from data-akamai-search while typing and shown through
+ * the <datalist> rendered next to the input.
+ */
+(function () {
+    'use strict';
+
+    var DELAY = 200;
+
+    function search(input, datalist) {
+        var request = new XMLHttpRequest(),
+            url = input.getAttribute('data-akamai-search') +
+                '?field=' + encodeURIComponent(input.getAttribute('data-akamai-field')) +
+                '&q=' + encodeURIComponent(input.value);
+
+        // Answers to older keystrokes are dropped
+        input.akamaiRequest = request;
+        request.onload = function () {
+            if (input.akamaiRequest !== request || request.status !== 200) {
+                return;
+            }
+            var results = JSON.parse(request.responseText).results;
+            while (datalist.firstChild) {
+                datalist.removeChild(datalist.firstChild);
+            }
+            for (var i = 0; i < results.length; i++) {
+                var option = document.createElement('option');
+                option.value = results[i].id;
+                datalist.appendChild(option);
+            }
+        };
+        request.open('GET', url);
+        request.send();
+    }
+
+    function bind(input) {
+        var datalist = document.getElementById(input.getAttribute('list')),
+            timer = null;
+        if (!datalist || input.akamaiBound) {
+            return;
+        }
+        input.akamaiBound = true;
+        input.addEventListener('input', function () {
+            clearTimeout(timer);
+            timer = setTimeout(function () { search(input, datalist); }, DELAY);
+        });
+        input.addEventListener('focus', function () {
+            if (!datalist.firstChild) {
+                search(input, datalist);
+            }
+        });
+    }
+
+    function bindAll() {
+        var inputs = document.querySelectorAll('input[data-akamai-search]');
+        for (var i = 0; i < inputs.length; i++) {
+            bind(inputs[i]);
+        }
+    }
+
+    if (document.readyState === 'loading') {
+        document.addEventListener('DOMContentLoaded', bindAll);
+    } else {
+        bindAll();
+    }
+    // Admin inlines added later
+    document.addEventListener('focusin', function (event) {
+        if (event.target.hasAttribute && event.target.hasAttribute('data-akamai-search')) {
+            bind(event.target);
+        }
+    });
+}());
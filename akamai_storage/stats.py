@@ -0,0 +1,32 @@
+import threading
+from collections import defaultdict
+
+
+class Counters(object):
+    """Thread safe named counters, used to expose storage statistics."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._values = defaultdict(int)
+
+    def incr(self, name, amount=1):
+        with self._lock:
+            self._values[name] += amount
+
+    def __getitem__(self, name):
+        with self._lock:
+            return self._values[name]
+
+    def ratio(self, name, other):
+        """name / (name + other), like a hit ratio, or None before either counted."""
+        with self._lock:
+            total = self._values[name] + self._values[other]
+            return float(self._values[name]) / total if total else None
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self._values)
+
+    def reset(self):
+        with self._lock:
+            self._values.clear()
@@ -1,20 +1,210 @@
+import calendar
 import ftplib
+import functools
+import hashlib
+import logging
+import mmap
 import os
-import urlparse
+import posixpath
+import socket
+import sys
+import threading
+import time
+import uuid
+from akamai import compression
+from akamai.cache import DirectoryCache, DiskCache, MetadataCache
+from akamai.concurrency import ordered_map
+from akamai.dedup import DedupIndex
+from akamai.listing import facts_entry, iter_list, iter_mlsd, parse_facts, parse_time
+from akamai.pool import ConnectionPool
+from akamai.stats import Counters
+from collections import namedtuple
+from contextlib import contextmanager
 from django.conf import settings
 from django.core.exceptions import ImproperlyConfigured
-from django.core.files import temp as tempfile
 from django.core.files.base import File
 from django.core.files.storage import Storage
-from django.utils import six
-from django.utils.encoding import force_bytes
-from io import BytesIO
+from django.utils import six, timezone
+from django.utils.six.moves.urllib.parse import urljoin
+from datetime import datetime
+from tempfile import SpooledTemporaryFile
+
+
+logger = logging.getLogger(__name__)
 
 
 class AkamaiNetStorageException(Exception):
     pass
 
 
+# Outcome of one item of a bulk operation, error is None when it succeeded
+BulkResult = namedtuple('BulkResult', ('name', 'value', 'error'))
+
+
+def is_connection_error(exc):
+    """
+    True when an ftplib error means the control connection itself is gone.
+    """
+    if isinstance(exc, ftplib.error_temp):
+        # 421 Service not available, closing control connection
+        return str(exc).startswith('421')
+    return isinstance(exc, (EOFError, socket.error))
+
+
+def is_transfer_error(exc):
+    """
+    True when a transfer broke off and may be resumed on a new connection.
+    """
+    if isinstance(exc, ftplib.error_temp):
+        # 425 Can't open data connection, 426 Connection closed; transfer aborted
+        if str(exc)[:3] in ('425', '426'):
+            return True
+    return is_connection_error(exc)
+
+
+def parse_features(response):
+    """
+    Parse a FEAT response into a dict of upper cased feature name to its
+    parameters, e.g. {'SIZE': '', 'MLST': 'type*;size*;modify*;'}.
+    """
+    features = {}
+    for line in response.splitlines()[1:-1]:
+        feature, _, params = line.strip().partition(' ')
+        if feature:
+            features[feature.upper()] = params
+    return features
+
+
+# FEAT HASH algorithm names and the X* checksum commands, with their hashlib names
+HASH_ALGORITHMS = {
+    'MD5': 'md5',
+    'SHA-1': 'sha1',
+    'SHA-256': 'sha256',
+    'SHA-512': 'sha512',
+}
+CHECKSUM_COMMANDS = (
+    ('XSHA256', 'sha256'),
+    ('XSHA1', 'sha1'),
+    ('XMD5', 'md5'),
+)
+
+
+class AkamaiFTP(ftplib.FTP):
+    """
+    FTP client that logs back in and resends a command once when the server
+    dropped the control connection, instead of probing it before every call.
+
+    The directories changed to with cwd() since PATH are changed to again
+    after logging back in, commands relative to them must not land in PATH.
+    """
+
+    def __init__(self, config, stats):
+        ftplib.FTP.__init__(self)
+        self._config = config
+        self._stats = stats
+        self._retry = True
+        self._type = None
+        # cwd() arguments since PATH, from the last absolute one
+        self._dirs = []
+        self.features = {}
+
+    def open(self):
+        self._type = None
+        self.connect(self._config['HOST'], self._config['PORT'])
+        self.login(self._config['USER'], self._config['PASSWORD'])
+        if self._config['PATH'] != '':
+            ftplib.FTP.cwd(self, self._config['PATH'])
+        self.voidcmd('TYPE I')
+        try:
+            self.features = parse_features(self.sendcmd('FEAT'))
+        except ftplib.error_perm:
+            self.features = {}
+        self._stats.incr('connects')
+
+    def reconnect(self):
+        self.close()
+        self._stats.incr('reconnects')
+        self.open()
+        for dirname in self._dirs:
+            ftplib.FTP.cwd(self, dirname)
+
+    def cwd(self, dirname):
+        resp = ftplib.FTP.cwd(self, dirname)
+        if dirname.startswith('/'):
+            self._dirs = [dirname]
+        else:
+            self._dirs.append(dirname)
+        return resp
+
+    def probe(self):
+        """Check the connection with a NOOP, without reconnecting."""
+        self._stats.incr('probes')
+        try:
+            ftplib.FTP.voidcmd(self, 'NOOP')
+            return True
+        except ftplib.all_errors:
+            return False
+
+    def sendcmd(self, cmd):
+        return self._typed(ftplib.FTP.sendcmd, cmd)
+
+    def voidcmd(self, cmd):
+        return self._typed(ftplib.FTP.voidcmd, cmd)
+
+    def size(self, filename):
+        # Servers refuse SIZE in ASCII mode, which LIST leaves behind
+        self.voidcmd('TYPE I')
+        return ftplib.FTP.size(self, filename)
+
+    def mlst(self, path):
+        """Facts of a single remote object, see RFC 3659."""
+        lines = self.sendcmd('MLST ' + path).splitlines()
+        if len(lines) < 3:
+            raise ftplib.error_proto('Unexpected MLST response')
+        facts, _, name = lines[1].lstrip(' ').partition(' ')
+        return parse_facts(facts)
+
+    def mdtm(self, path):
+        resp = self.sendcmd('MDTM ' + path)
+        if resp[:3] != '213':
+            raise ftplib.error_reply(resp)
+        return parse_time(resp[3:])
+
+    def ntransfercmd(self, cmd, rest=None):
+        # Retried as a whole, the data connection belongs to the control connection
+        return self._retrying(ftplib.FTP.ntransfercmd, cmd, rest)
+
+    def quit(self):
+        self._retry = False
+        return ftplib.FTP.quit(self)
+
+    def _typed(self, method, cmd):
+        # Skip TYPE commands that would not change the transfer type
+        if not cmd.startswith('TYPE '):
+            return self._retrying(method, cmd)
+        if cmd == self._type:
+            return '200 Type already set'
+        resp = self._retrying(method, cmd)
+        self._type = cmd
+        return resp
+
+    def _retrying(self, method, *args):
+        if not self._retry:
+            return method(self, *args)
+
+        self._retry = False
+        try:
+            try:
+                return method(self, *args)
+            except ftplib.all_errors as e:
+                if not is_connection_error(e):
+                    raise
+            self.reconnect()
+            return method(self, *args)
+        finally:
+            self._retry = True
+
+
 class AkamaiNetStorage(Storage):
     """Akamai NetStorage class for Django pluggable storage system."""
 
@@ -22,51 +212,208 @@ class AkamaiNetStorage(Storage):
         self._config_key = file_storage_key
         self._config = self._get_config(self._config_key)
         self._base_url = self._config['MEDIA_URL']
-        self._connection = None
+        self.stats = Counters()
+        self._pool = ConnectionPool(
+            self._connect,
+            max_size=self._config.get('POOL_MAX_SIZE', 4),
+            idle_timeout=self._config.get('POOL_IDLE_TIMEOUT', 60),
+            checkout_timeout=self._config.get('POOL_CHECKOUT_TIMEOUT', None),
+            probe=AkamaiFTP.probe,
+            probe_after=self._config.get('POOL_PROBE_AFTER', None),
+        )
+        self._local = threading.local()
+        # Send STOR/RETR/SIZE/DELE with full paths instead of changing directories
+        self._full_paths = self._config.get('FULL_PATH_COMMANDS', True)
+        self._known_dirs = DirectoryCache(
+            max_size=self._config.get('DIRECTORY_CACHE_SIZE', 10000),
+            ttl=self._config.get('DIRECTORY_CACHE_TTL', 300),
+        )
+        self._retries = self._config.get('RETRIES', 3)
+        self._retry_backoff = self._config.get('RETRY_BACKOFF', 0.5)
+        self._resumable_uploads = self._config.get('RESUMABLE_UPLOADS', False)
+        # None, 'size' or 'checksum'
+        self._verify_uploads = self._config.get('VERIFY_UPLOADS', None)
+        self._metadata = None
+        if self._config.get('METADATA_CACHE'):
+            self._metadata = MetadataCache.from_config(self._config_key, self._config['METADATA_CACHE'])
+        self._disk_cache = None
+        if self._config.get('DISK_CACHE'):
+            self._disk_cache = DiskCache.from_config(self._config['DISK_CACHE'])
+        self._compress = self._get_compress_config(self._config.get('COMPRESS'))
+        self._dedup = None
+        if self._config.get('DEDUP'):
+            self._dedup = DedupIndex.from_config(self._config_key, self._config['DEDUP'])
 
     def _get_config(self, key):
         if settings.FILE_STORAGES and key in settings.FILE_STORAGES:
             return settings.FILE_STORAGES[key]
         raise ImproperlyConfigured('Can not find configuration for Akamai NetStorage with key: {}'.format(key), code='storage_akamai_config')
 
+    def _get_compress_config(self, config):
+        """
+        COMPRESS settings with their defaults, or None when no variants are
+        written. ENCODINGS are in order of preference of url(). A dict
+        without settings, or True, writes variants with the defaults.
+        """
+        if not config and not isinstance(config, dict):
+            return None
+        if not isinstance(config, dict):
+            config = {}
+        default_encodings = ('br', 'gzip') if compression.brotli is not None else ('gzip', )
+        config = {
+            'ENCODINGS': tuple(config.get('ENCODINGS', default_encodings)),
+            'EXTENSIONS': tuple(ext.lower() for ext in config.get('EXTENSIONS', compression.DEFAULT_EXTENSIONS)),
+            'GZIP_LEVEL': config.get('GZIP_LEVEL', 9),
+            'BROTLI_QUALITY': config.get('BROTLI_QUALITY', 9),
+        }
+        for encoding in config['ENCODINGS']:
+            if encoding not in compression.SUFFIXES:
+                raise ImproperlyConfigured('Unknown COMPRESS encoding: %r' % encoding)
+            if encoding == 'br' and compression.brotli is None:
+                raise ImproperlyConfigured('The brotli package is required for COMPRESS encoding br')
+        return config
+
     # Defined by Storage
 
     def _open(self, name, mode='rb'):
-        self._start_connection()
-        memory, file = self._retrieve_file(name)
-        if memory:
-            ret_file = AkamaiContentFile(file, name, self)
-        else:
-            ret_file = AkamaiFile(file, name, self)
-        return ret_file
+        remote_name = self._resolve(name)
+        if self._disk_cache is not None:
+            cached = self._open_cached(remote_name)
+            if cached is not None:
+                cached.name = name
+                return cached
+        if self._config.get('STREAMING_OPEN', False):
+            return self.open_stream(name)
+        return AkamaiFile(self._retrieve_file(remote_name), name, self)
+
+    def open_stream(self, name, offset=0):
+        """
+        Open name for reading straight from the network, starting at offset.
+        See AkamaiStreamingFile.
+        """
+        return AkamaiStreamingFile(self._resolve(name), self, offset)
+
+    def _open_cached(self, name):
+        """
+        Open name from the disk cache, copying it there first when this
+        version of it is not cached yet. None when it is too large to cache.
+
+        The version is read from the server first, so a changed object is
+        never served from an old copy: an MLST (SIZE and MDTM without it)
+        even when the copy is cached. With METADATA_CACHE the version comes
+        from the metadata cache instead, a hit then needs no round trip but
+        may serve a copy up to the TIMEOUT of that cache old.
+        """
+        size, mtime = self._version(name)
+        key = self._remote_path(name)
+        path = self._disk_cache.get(key, size, mtime)
+        if path is not None:
+            try:
+                file = open(path, 'rb')
+            except IOError:
+                # Evicted in the meantime
+                path = None
+            else:
+                self.stats.incr('disk_cache_hits')
+                self.stats.incr('disk_cache_bytes_saved', size)
+
+        if path is None:
+            if size > self._disk_cache.max_object_bytes:
+                return None
+            self.stats.incr('disk_cache_misses')
+            with self._connected():
+                try:
+                    path = self._disk_cache.put(key, size, mtime, lambda f: self._download(name, f.write))
+                except ftplib.all_errors:
+                    raise AkamaiNetStorageException('Error retrieving remote file %s' % name)
+            file = open(path, 'rb')
+
+        return AkamaiFile(file, name, self)
+
+    def _version(self, name):
+        """Size and UTC modification time of name, in one MLST if possible."""
+        if self._metadata is not None:
+            return self.size(name), self._cached('modified_time', name, self._modified_time)
+        with self._connected():
+            if 'MLST' not in self._connection.features:
+                return self._size(name), self._modified_time(name)
+            try:
+                facts = self._connection.mlst(self._remote_path(name))
+                return int(facts['size']), parse_time(facts['modify'])
+            except (ftplib.all_errors, KeyError, ValueError):
+                raise AkamaiNetStorageException('Error retrieving remote file %s' % name)
 
     def _save(self, name, content):
         content.open()
-        self._start_connection()
-        self._put_file(name, content)
+        try:
+            if self._dedup is not None:
+                self._put_deduplicated(name, content)
+            else:
+                self._put_file(name, content)
+        except Exception:
+            # The save failed half way, variants may be gone
+            for variant in self._variant_names(name):
+                self._invalidate(variant)
+            raise
+        finally:
+            self._invalidate(name)
         content.close()
-        content = self._open(name)
         return name
 
-    def get_available_name(self, name):
+    def get_available_name(self, name, max_length=None):
         return name
 
     def delete(self, name):
-        if not self.exists(name):
-            return
-        self._start_connection()
-        try:
-            self._connection.delete(name)
-        except ftplib.all_errors:
-            raise AkamaiNetStorageException('Error when removing %s' % name)
+        path = self._remote_path(name)
+        with self._connected():
+            if self._dedup is not None and self._release(name):
+                # An alias, or its content lives on under an alias
+                self._invalidate(name)
+                self._delete_variants(name)
+                return
+            # Not through the metadata cache, the object may have appeared since
+            if not self._exists(name):
+                return
+            try:
+                self._connection.delete(path)
+            except ftplib.error_perm:
+                # Not a file, remove it as an (empty) directory
+                try:
+                    self._connection.rmd(path)
+                except ftplib.all_errors:
+                    raise AkamaiNetStorageException('Error when removing %s' % name)
+                self._known_dirs.discard(path)
+            except ftplib.all_errors:
+                raise AkamaiNetStorageException('Error when removing %s' % name)
+            finally:
+                self._invalidate(name)
+            self._delete_variants(name)
 
     def exists(self, name):
-        self._start_connection()
+        return self._cached('exists', name, self._exists)
+
+    def _exists(self, name):
+        path = self._remote_path(name)
+        features = self._connection.features
         try:
-            if name in self._connection.nlst(os.path.dirname(name) + '/'):
+            if 'MLST' in features:
+                facts = self._connection.mlst(path)
+                if facts.get('type', '').lower() == 'dir':
+                    self._known_dirs.add(path)
                 return True
-            else:
-                return False
+            if 'SIZE' in features:
+                try:
+                    self._connection.size(path)
+                    return True
+                except ftplib.error_perm:
+                    # Missing, or a directory which has no size
+                    if path in self._known_dirs:
+                        return True
+
+            directory = posixpath.dirname(path)
+            listing = self._connection.nlst(directory) if directory else self._connection.nlst()
+            # Depending on the server names are listed with or without their directory
+            return path in listing or posixpath.basename(path) in listing
         except ftplib.error_temp:
             return False
         except ftplib.error_perm:
@@ -76,15 +423,33 @@ class AkamaiNetStorage(Storage):
             raise AkamaiNetStorageException('Error when testing existence of %s' % name)
 
     def listdir(self, path):
-        self._start_connection()
+        return self._cached('listdir', path, self._listdir)
+
+    def _listdir(self, path):
         try:
             dirs, files = self._get_dir_details(path)
-            return dirs.keys(), files.keys()
+            return list(dirs.keys()), list(files.keys())
         except AkamaiNetStorageException:
             raise
 
     def size(self, name):
-        self._start_connection()
+        return self._cached('size', name, self._size)
+
+    def _size(self, name):
+        path = self._remote_path(name)
+        features = self._connection.features
+        try:
+            if 'MLST' in features:
+                return int(self._connection.mlst(path).get('size', 0))
+            if 'SIZE' in features:
+                return self._connection.size(path) or 0
+        except ftplib.error_perm:
+            # Missing file
+            return 0
+        except (ftplib.all_errors, ValueError):
+            return 0
+
+        # No single object lookup, read it from the parent directory listing
         try:
             dirs, files = self._get_dir_details(os.path.dirname(name))
             if os.path.basename(name) in files:
@@ -94,156 +459,897 @@ class AkamaiNetStorage(Storage):
         except AkamaiNetStorageException:
             return 0
 
-    def url(self, name):
+    def url(self, name, accept_encoding=None):
+        """
+        With the Accept-Encoding header of a request, the URL of the best
+        pre-compressed variant of name the client accepts, if one was saved
+        (see COMPRESS). The server must serve it with the matching
+        Content-Encoding.
+        """
         if self._base_url is None:
             raise ValueError("This file is not accessible via a URL.")
-        return urlparse.urljoin(self._base_url, name).replace('\\', '/')
+        if accept_encoding:
+            name = self.variant(name, accept_encoding)[0]
+        else:
+            name = self._resolve(name)
+        return urljoin(self._base_url, name).replace('\\', '/')
 
-    # TODO Access, created, and modified time methods
+    def variant(self, name, accept_encoding):
+        """
+        (name of the variant, Content-Encoding) of the best pre-compressed
+        variant of name for accept_encoding, or (name, None).
 
-    # Akamai NetStorage Storage functions
+        Variants are only served with the metadata cache (METADATA_CACHE),
+        where save() records those it wrote: without it every url() would
+        cost a round trip to the server per accepted encoding.
+        """
+        name = self._resolve(name)
+        if self._metadata is not None and self._variant_names(name) and self.exists(name):
+            accepted = compression.parse_accept_encoding(accept_encoding)
+            for encoding in self._compress['ENCODINGS']:
+                variant = name + compression.SUFFIXES[encoding]
+                if encoding in accepted and self.exists(variant):
+                    return variant, encoding
+        return name, None
 
-    def _create_temp_file(self):
-        self.stream_class = False
-        if settings.FILE_UPLOAD_TEMP_DIR:
-            file = tempfile.NamedTemporaryFile(suffix='.akamai', dir=settings.FILE_UPLOAD_TEMP_DIR)
-        else:
-            file = tempfile.NamedTemporaryFile(suffix='.akamai')
-        return file
+    def accessed_time(self, name):
+        # FTP does not track access times, the last modification is the closest
+        return self._local_time(self._cached('modified_time', name, self._modified_time))
 
-    def _create_stream(self, content=''):
-        stream_class = BytesIO
-        if six.PY2:
-            content = force_bytes(content)
-        return stream_class(content)
+    def created_time(self, name):
+        return self._local_time(self._cached('created_time', name, self._created_time))
 
-    def _start_connection(self):
-        # Check if connection is still alive and if not, drop it.
-        if self._connection is not None:
+    def modified_time(self, name):
+        return self._local_time(self._cached('modified_time', name, self._modified_time))
+
+    def get_accessed_time(self, name):
+        return self._datetime(self._cached('modified_time', name, self._modified_time))
+
+    def get_created_time(self, name):
+        return self._datetime(self._cached('created_time', name, self._created_time))
+
+    def get_modified_time(self, name):
+        return self._datetime(self._cached('modified_time', name, self._modified_time))
+
+    def _modified_time(self, name):
+        return self._remote_time(name, 'modify')
+
+    def _created_time(self, name):
+        return self._remote_time(name, 'create')
+
+    def _remote_time(self, name, fact):
+        """UTC time of name from MLST, MDTM or, failing both, its parent listing."""
+        path = self._remote_path(name)
+        features = self._connection.features
+        try:
+            if 'MLST' in features:
+                facts = self._connection.mlst(path)
+                # Few servers know when a file was created, use its last change
+                return parse_time(facts.get(fact) or facts['modify'])
+            if 'MDTM' in features:
+                return self._connection.mdtm(path)
+        except (ftplib.all_errors, KeyError, ValueError):
+            raise AkamaiNetStorageException('Error getting the time of %s' % name)
+
+        # Minute precision at best, in the time zone of the server
+        mtime = None
+        for entry in self._iter_listing(posixpath.dirname(path)):
+            if entry.path == path:
+                mtime = entry.mtime
+        if mtime is None:
+            raise AkamaiNetStorageException('Error getting the time of %s' % name)
+        return mtime
+
+    def _local_time(self, utc):
+        # Naive local time, like FileSystemStorage
+        return datetime.fromtimestamp(calendar.timegm(utc.timetuple())).replace(microsecond=utc.microsecond)
+
+    def _datetime(self, utc):
+        # Aware when USE_TZ is set, like FileSystemStorage.get_*_time()
+        if settings.USE_TZ:
+            return utc.replace(tzinfo=timezone.utc)
+        return self._local_time(utc)
+
+    # Bulk operations
+
+    def save_many(self, items, concurrency=None):
+        """
+        Save (name, content) pairs over several connections at once, yielding a
+        BulkResult per pair, in order, with the name the content was saved
+        under as value. Only a few pairs are read ahead of the consumer.
+        """
+        def save(item):
+            name, content = item
+            return self.save(name, content)
+
+        for (name, content), value, error in ordered_map(save, items, self._bulk_workers(concurrency)):
+            yield BulkResult(name, value, error)
+
+    def open_many(self, names, mode='rb', concurrency=None):
+        """
+        Open names over several connections at once, yielding a BulkResult per
+        name, in order, with the opened file as value.
+        """
+        def open_file(name):
+            return self.open(name, mode)
+
+        for name, value, error in ordered_map(open_file, names, self._bulk_workers(concurrency)):
+            yield BulkResult(name, value, error)
+
+    def exists_many(self, names, concurrency=None):
+        """
+        Existence of many names as a dict by name. Names are grouped by
+        directory and each directory is listed once, several at a time,
+        instead of testing every name on its own.
+        """
+        by_directory = {}
+        resolved = self._dedup.resolve_many(names) if self._dedup is not None else {}
+        for name in names:
+            path = self._remote_path(resolved.get(name, name))
+            by_directory.setdefault(posixpath.dirname(path), []).append((name, path))
+
+        found = {}
+        for directory, listed, error in ordered_map(self._listed_names, list(by_directory),
+                                                    self._bulk_workers(concurrency)):
+            for name, path in by_directory[directory]:
+                if error is not None:
+                    # Missing directory or failed listing, exists() tells which
+                    found[name] = self.exists(name)
+                    continue
+                found[name] = not path or posixpath.basename(path) in listed
+                if self._metadata is not None:
+                    self._metadata.set('exists', self._remote_path(name), found[name])
+        return found
+
+    def _listed_names(self, path):
+        """Names of every object in directory path, as a set."""
+        return set(entry.name for entry in self._iter_listing(path))
+
+    def walk(self, path='', max_depth=None, concurrency=None, max_entries=None, descend=None, onerror=None):
+        """
+        Yield an Entry for every object below path, listing the directories
+        breadth first, one plain listing each and several at a time on pooled
+        connections, instead of in a single LIST -R. The entries of a
+        directory are yielded as soon as its listing is done, in listing
+        order, and only the paths of the next level are kept in memory.
+
+        max_depth=1 lists path alone, 2 also the directories in it and so on.
+        Walking stops after max_entries entries. descend(entry) returning
+        False leaves a directory out. A directory that can not be listed
+        raises, unless onerror is given, which is called with the error and
+        the walk goes on.
+        """
+        workers = self._bulk_workers(concurrency)
+        level = [self._remote_path(path)]
+        depth = 0
+        count = 0
+        while level and (max_depth is None or depth < max_depth):
+            depth += 1
+            next_level = []
+            for directory, listing, error in ordered_map(self._list_directory, level, workers):
+                if error is not None:
+                    if onerror is None:
+                        raise error
+                    onerror(error)
+                    continue
+                for entry in listing:
+                    if entry.type == 'dir' and (descend is None or descend(entry)):
+                        next_level.append(entry.path)
+                    yield entry
+                    count += 1
+                    if max_entries is not None and count >= max_entries:
+                        return
+            level = next_level
+
+    def _list_directory(self, path):
+        # Runs on a worker thread of walk(), and so on a pooled connection of its own
+        return list(self._iter_listing(path))
+
+    def _stat_directory(self, path):
+        """
+        Entry of the directory path from an MLST, None when the server has
+        no MLST. Safe to run on worker threads like _list_directory().
+        """
+        path = self._remote_path(path)
+        with self._connected():
+            if 'MLST' not in self._connection.features:
+                return None
             try:
-                self._connection.pwd()
+                return facts_entry(self._connection.mlst(path), path)
             except ftplib.all_errors:
-                self._connection = None
+                raise AkamaiNetStorageException('Error retrieving remote directory %s' % path)
 
-        # Real reconnect
+    def _iter_tree(self, path, sections=None):
+        """
+        Every object below path, by walk() with PARALLEL_WALK or else by a
+        single LIST -R. The directories below path whose contents were
+        listed are appended to the list sections, when given; a LIST -R
+        output may leave some out.
+        """
+        if self._config.get('PARALLEL_WALK', False):
+            def descend(entry):
+                # Listed in full once the walk is over, or the walk raises
+                if sections is not None:
+                    sections.append(entry.path)
+                return True
+            return self.walk(path, descend=descend)
+        return self._iter_listing(path, recursive=True, sections=sections)
+
+    def _bulk_workers(self, concurrency):
+        # More workers than connections would only wait for the pool
+        concurrency = concurrency or self._config.get('BULK_CONCURRENCY', self._pool.max_size)
+        return min(concurrency, self._pool.max_size)
+
+    # Akamai NetStorage Storage functions
+
+    def _cached(self, kind, name, lookup):
+        """
+        Answer a metadata lookup from the metadata cache when it is enabled,
+        otherwise run lookup() on a pooled connection with the name of the
+        object holding the content of name. Cache entries are keyed by name,
+        a hit needs no dedup lookup.
+        """
+        if self._metadata is None:
+            with self._connected():
+                return lookup(name if kind == 'listdir' else self._resolve(name))
+
+        key = self._remote_path(name)
+        value = self._metadata.get(kind, key)
+        if value is not self._metadata.missing:
+            self.stats.incr('metadata_cache_hits')
+            return value
+
+        self.stats.incr('metadata_cache_misses')
+        with self._connected():
+            value = lookup(name if kind == 'listdir' else self._resolve(name))
+        self._metadata.set(kind, key, value)
+        return value
+
+    def _resolve(self, name):
+        """Name of the remote object holding the content of name."""
+        if self._dedup is None:
+            return name
+        return self._dedup.resolve(name)
+
+    def _invalidate(self, name):
+        if self._metadata is not None:
+            self._metadata.invalidate(self._remote_path(name))
+        if self._disk_cache is not None:
+            self._disk_cache.discard(self._remote_path(name))
+
+    @property
+    def _connection(self):
+        """The connection checked out by the current thread, if any."""
+        return getattr(self._local, 'connection', None)
+
+    def _connect(self):
+        ftp = AkamaiFTP(self._config, self.stats)
+        try:
+            ftp.open()
+            return ftp
+        except ftplib.all_errors:
+            raise AkamaiNetStorageException('Connection or login error using data %s' % repr(self._config))
+
+    @contextmanager
+    def _connected(self):
+        """
+        Hold a pooled connection for the current thread while the block runs.
+
+        Nested blocks reuse the connection of the outermost one, so helpers
+        can be called from public methods or on their own. A connection that
+        raised is dropped instead of going back to the pool, its working
+        directory can not be trusted anymore.
+        """
+        if self._connection is not None:
+            yield self._connection
+            return
+
+        self._local.connection = self._pool.checkout()
+        discard = False
+        try:
+            yield self._local.connection
+        except:
+            discard = True
+            raise
+        finally:
+            connection, self._local.connection = self._local.connection, None
+            self._pool.checkin(connection, discard=discard)
+
+    def _start_connection(self):
+        """
+        Pin a pooled connection to the current thread until _end_connection()
+        """
         if self._connection is None:
-            ftp = ftplib.FTP()
-            try:
-                ftp.connect(self._config['HOST'], self._config['PORT'])
-                ftp.login(self._config['USER'], self._config['PASSWORD'])
-                if self._config['PATH'] != '':
-                    ftp.cwd(self._config['PATH'])
-                self._connection = ftp
-                return
-            except ftplib.all_errors:
-                raise AkamaiNetStorageException('Connection or login error using data %s' % repr(self._config))
+            self._local.connection = self._pool.checkout()
 
     def _end_connection(self):
         """
-        Ignore, keep the connection open for as long as possible.
-        Use disconnect() to terminate the connection
+        Give a connection pinned by _start_connection() back to the pool.
         """
-        pass
+        connection = self._connection
+        if connection is not None:
+            self._local.connection = None
+            self._pool.checkin(connection)
 
     def disconnect(self):
-        self._connection.quit()
-        self._connection = None
+        connection = self._connection
+        if connection is not None:
+            self._local.connection = None
+            try:
+                connection.quit()
+            except ftplib.all_errors:
+                pass
+            self._pool.checkin(connection, discard=True)
+        self._pool.clear()
+
+    def _remote_path(self, name):
+        """
+        Path of name relative to the configured PATH, which is the working
+        directory of every pooled connection.
+        """
+        path = posixpath.normpath(name.replace('\\', '/')).lstrip('/')
+        return '' if path == '.' else path
 
     def _mkremdirs(self, path):
+        if self._full_paths:
+            return self._mkremdirs_full_path(path)
+
+        if not path or self._remote_path(path) in self._known_dirs:
+            return
+
         pwd = self._connection.pwd()
         path_splitted = path.split('/')
         for path_part in path_splitted:
             try:
                 self._connection.cwd(path_part)
-            except:
+            except ftplib.error_perm:
                 try:
                     self._connection.mkd(path_part)
                     self._connection.cwd(path_part)
                 except ftplib.all_errors:
                     raise AkamaiNetStorageException('Cannot create directory chain %s' % path)
         self._connection.cwd(pwd)
+        self._known_dirs.add_tree(self._remote_path(path))
         return
 
+    def _mkremdirs_full_path(self, path):
+        if not path or path in self._known_dirs:
+            return
+
+        parts = path.split('/')
+        for depth in range(1, len(parts) + 1):
+            directory = '/'.join(parts[:depth])
+            if directory in self._known_dirs:
+                continue
+            try:
+                self._connection.mkd(directory)
+                self._known_dirs.add(directory)
+            except ftplib.error_perm:
+                # Most likely it exists already, a real problem surfaces with STOR
+                pass
+
     def _put_file(self, name, content):
-        # Connection must be open!
-        try:
-            self._mkremdirs(os.path.dirname(name))
-            pwd = self._connection.pwd()
-            self._connection.cwd(os.path.dirname(name))
-            self._connection.storbinary('STOR ' + os.path.basename(name), content.file, content.DEFAULT_CHUNK_SIZE)
-            self._connection.cwd(pwd)
-        except ftplib.all_errors:
-            raise AkamaiNetStorageException('Error writing file %s' % name)
+        with self._connected():
+            try:
+                if self._full_paths:
+                    path = self._remote_path(name)
+                    self._mkremdirs(posixpath.dirname(path))
+                    command, digest = self._checksum_method()
+                    observers = [digest.update] if digest else []
+                    # Compressed while the original streams, the content is read once
+                    variants = self._variant_writers(name)
+                    observers.extend(variant.write for variant in variants)
+                    file = ObservedReader(content.file, observers)
+                    try:
+                        self._upload(path, file, content.DEFAULT_CHUNK_SIZE)
+                        if self._verify_uploads:
+                            self._verify_upload(path, file.observed, command, digest)
+                        # A successful STOR proves the whole directory chain exists
+                        self._known_dirs.add_tree(posixpath.dirname(path))
+                        self._put_variants(path, variants, file.observed, content.DEFAULT_CHUNK_SIZE)
+                    finally:
+                        for variant in variants:
+                            variant.close()
+                else:
+                    self._mkremdirs(os.path.dirname(name))
+                    pwd = self._connection.pwd()
+                    self._connection.cwd(os.path.dirname(name))
+                    self._connection.storbinary('STOR ' + os.path.basename(name), content.file, content.DEFAULT_CHUNK_SIZE)
+                    self._connection.cwd(pwd)
+            except ftplib.all_errors:
+                raise AkamaiNetStorageException('Error writing file %s' % name)
 
         # TODO flush
 
-    def _retrieve_file(self, name):
-        try:
-            pwd = self._connection.pwd()
-            self._connection.cwd(os.path.dirname(name))
+    def _put_deduplicated(self, name, content):
+        """
+        Save name as an alias of a remote object with the same content when
+        the dedup index knows one, instead of transferring it again. The
+        content is hashed in a pass over the local file before anything is
+        sent; the bytes not sent are counted in stats['dedup_bytes_avoided'].
+        """
+        digest, size = self._dedup.digest(content.file, content.DEFAULT_CHUNK_SIZE)
+        with self._connected():
+            if digest is None or size < self._dedup.min_size:
+                self._release(name)
+                self._put_file(name, content)
+                return
+
+            stored = self._dedup.lookup(digest)
+            # The index can be out of date, trust it only with the remote size
+            if stored is not None and stored.size == size and \
+                    self._uploaded_size(self._remote_path(stored.path)) == size:
+                if stored.path != name:
+                    self._release(name, delete=True)
+                    self._dedup.add_alias(name, stored)
+                self.stats.incr('dedup_hits')
+                self.stats.incr('dedup_bytes_avoided', size)
+                return
+
+            self.stats.incr('dedup_misses')
+            self._release(name)
+            self._put_file(name, content)
+            self._dedup.record(digest, size, name)
+
+    def _release(self, name, delete=False):
+        """
+        Free name before it is written or deleted: drop it when it is an
+        alias, or when it holds content other names are aliases of, move the
+        object to the first of them (a rename on the server, nothing is
+        transferred). True when nothing is left under name, with delete=True
+        a remaining object is removed. The compressed variants of the object
+        go with it.
+        """
+        if self._dedup.remove_alias(name):
+            return True
+        path = self._remote_path(name)
+        content, alias = self._dedup.held(name)
+        if alias is not None:
+            try:
+                self._mkremdirs(posixpath.dirname(alias.name))
+                self._connection.rename(path, self._remote_path(alias.name))
+            except ftplib.all_errors:
+                raise AkamaiNetStorageException('Error moving %s to %s' % (name, alias.name))
+            self._move_variants(name, alias.name)
+            self._dedup.promote(content, alias)
+            self._invalidate(alias.name)
+            return True
+        if content is not None:
+            self._dedup.forget(content)
+        if delete:
+            try:
+                self._connection.delete(path)
+            except ftplib.error_perm:
+                pass
+            self._invalidate(name)
+            self._delete_variants(name)
+            return True
+        return False
+
+    def _move_variants(self, name, new_name):
+        """
+        Move the variants of name to new_name along with the object, those
+        new_name would not have (another extension) are removed.
+        """
+        kept = set(self._variant_names(new_name))
+        for variant in self._variant_names(name):
+            moved = new_name + variant[len(name):]
+            try:
+                if moved in kept:
+                    self._connection.rename(self._remote_path(variant), self._remote_path(moved))
+                else:
+                    self._connection.delete(self._remote_path(variant))
+            except ftplib.error_perm:
+                # Never saved, or not smaller than the original
+                pass
+            finally:
+                self._invalidate(variant)
+                self._invalidate(moved)
 
-            if self.size(name) > settings.FILE_UPLOAD_MAX_MEMORY_SIZE:
-                file_in_memory = False
-                file = self._create_temp_file()
+    def _variant_names(self, name):
+        """Names of the pre-compressed variants saved along with name."""
+        if self._compress is None or posixpath.splitext(name)[1].lower() not in self._compress['EXTENSIONS']:
+            return []
+        return [name + compression.SUFFIXES[encoding] for encoding in self._compress['ENCODINGS']]
+
+    def _variant_writers(self, name):
+        if not self._variant_names(name):
+            return []
+        writers = []
+        for encoding in self._compress['ENCODINGS']:
+            if encoding == 'br':
+                encoder = compression.BrotliEncoder(self._compress['BROTLI_QUALITY'])
             else:
-                file_in_memory = True
-                file = self._create_stream()
+                encoder = compression.GzipEncoder(self._compress['GZIP_LEVEL'])
+            writers.append(compression.VariantWriter(encoding, encoder, settings.FILE_UPLOAD_MAX_MEMORY_SIZE))
+        return writers
+
+    def _put_variants(self, path, variants, size, blocksize):
+        """
+        Upload the compressed variants next to path. A variant that is not
+        smaller than the original is not worth serving, a previous version of
+        it is removed instead.
 
-            self._connection.retrbinary('RETR ' + os.path.basename(name), file.write)
-            file.seek(0)
-            self._connection.cwd(pwd)
+        Variants go through a temporary name, url() never serves a truncated
+        one. When one can not be written the previous version, compressed
+        from the previous content, is removed: the original is saved already,
+        it is served uncompressed rather than failing the save. Which
+        variants exist is recorded in the metadata cache.
+        """
+        for variant in variants:
+            variant_path = path + variant.suffix
+            variant_size = variant.finish()
+            written = False
+            try:
+                if variant_size < size:
+                    self._upload(variant_path, variant.file, blocksize, replace=True)
+                    written = True
+                    self.stats.incr('compressed_variants')
+                    self.stats.incr('compressed_bytes_saved', size - variant_size)
+                else:
+                    self.stats.incr('compressed_variants_skipped')
+                    try:
+                        self._connection.delete(variant_path)
+                    except ftplib.error_perm:
+                        pass
+            except ftplib.all_errors as e:
+                self.stats.incr('compressed_variants_failed')
+                logger.warning('Error writing compressed variant %s, it is dropped: %s', variant_path, e)
+                self._remove_after_failure(variant_path)
+            if self._metadata is not None:
+                self._metadata.set('exists', variant_path, written)
+            if self._disk_cache is not None:
+                self._disk_cache.discard(variant_path)
 
-            return file_in_memory, file
+    def _delete_variants(self, name):
+        for variant in self._variant_names(name):
+            try:
+                self._connection.delete(self._remote_path(variant))
+            except ftplib.error_perm:
+                # Never saved, or not smaller than the original
+                pass
+            finally:
+                self._invalidate(variant)
+
+    def _upload(self, path, file, blocksize, replace=False):
+        """
+        STOR file to path on the connection of the current thread, retrying
+        up to RETRIES times when the transfer breaks off.
+
+        With RESUMABLE_UPLOADS, or replace, the data goes to a temporary name
+        next to path which is renamed into place once its size matches, path
+        is never left truncated. With RESUMABLE_UPLOADS a retry appends (APPE)
+        to what already arrived instead of starting from the beginning. Bytes
+        that had to be sent twice are counted in stats['upload_bytes_resent'].
+        The temporary file is removed when the upload fails for good, a later
+        save would not resume it.
+        """
+        try:
+            start = file.tell()
+        except (AttributeError, IOError, ValueError):
+            start = None
+
+        if (self._resumable_uploads or replace) and start is not None:
+            directory, basename = posixpath.split(path)
+            target = posixpath.join(directory, '.{}.{}.part'.format(basename, uuid.uuid4().hex[:12]))
+        else:
+            target = path
+
+        try:
+            self._send(path, target, file, blocksize, start)
+        except:
+            exc_info = sys.exc_info()
+            if target != path:
+                self._remove_after_failure(target)
+            six.reraise(*exc_info)
+
+    def _send(self, path, target, file, blocksize, start):
+        sent = [0]
+
+        def count(data):
+            sent[0] += len(data)
+
+        offset = 0
+        attempt = 0
+        while True:
+            try:
+                command = 'APPE ' if offset else 'STOR '
+                self._connection.storbinary(command + target, file, blocksize, count)
+                break
+            except ftplib.all_errors as e:
+                # Without a position to go back to the content is lost
+                if attempt >= self._retries or start is None or not is_transfer_error(e):
+                    raise
+            attempt += 1
+            self.stats.incr('upload_retries')
+            self._wait_before_retry(attempt)
+            self._connection.reconnect()
+            offset = self._uploaded_size(target) if self._resumable_uploads and target != path else 0
+            file.seek(start + offset)
+
+        size = file.tell() - start
+        self.stats.incr('upload_bytes_resent', max(sent[0] - size, 0))
+
+        if target != path:
+            uploaded = self._uploaded_size(target)
+            if uploaded != size:
+                raise ftplib.error_reply('Uploaded {} bytes of {} to {}'.format(uploaded, size, target))
+            try:
+                self._connection.rename(target, path)
+            except ftplib.error_perm:
+                # Some servers do not rename over an existing file
+                self._connection.delete(path)
+                self._connection.rename(target, path)
+
+    def _remove_after_failure(self, path):
+        try:
+            # The reply of the broken transfer may still be pending
+            self._connection.reconnect()
+            self._connection.delete(path)
         except ftplib.all_errors:
+            # Never created, or the server is gone, nothing more to do
+            pass
+
+    def _checksum_method(self):
+        """
+        The server side checksum command to verify uploads with and a hash
+        object to compute the local checksum, or (None, None).
+        """
+        if self._verify_uploads != 'checksum':
+            return None, None
+        features = self._connection.features
+        if 'HASH' in features:
+            # The algorithm currently selected is marked with a star
+            for algorithm in features['HASH'].split(';'):
+                if algorithm.endswith('*') and algorithm[:-1].upper() in HASH_ALGORITHMS:
+                    return 'HASH', hashlib.new(HASH_ALGORITHMS[algorithm[:-1].upper()])
+        for command, algorithm in CHECKSUM_COMMANDS:
+            if command in features:
+                return command, hashlib.new(algorithm)
+        return None, None
+
+    def _verify_upload(self, path, size, command, digest):
+        """
+        Compare the remote size, and checksum when the server can compute
+        one, with what was sent.
+        """
+        uploaded = self._uploaded_size(path)
+        if uploaded != size:
+            self.stats.incr('upload_verify_failures')
+            raise ftplib.error_reply('Uploaded {} bytes of {} to {}'.format(uploaded, size, path))
+        if command is not None:
+            resp = self._connection.sendcmd('{} {}'.format(command, path))
+            if digest.hexdigest() not in resp.lower():
+                self.stats.incr('upload_verify_failures')
+                raise ftplib.error_reply('Checksum mismatch for {}: {}'.format(path, resp))
+        self.stats.incr('upload_verified')
+
+    def _uploaded_size(self, path):
+        try:
+            return self._connection.size(path) or 0
+        except ftplib.error_perm:
+            return 0
+
+    def _retrieve_file(self, name):
+        """
+        Download name into a buffer that stays in memory up to
+        FILE_UPLOAD_MAX_MEMORY_SIZE bytes and rolls over to a temporary file
+        beyond, so the size is not needed up front.
+        """
+        file = SpooledTemporaryFile(
+            max_size=settings.FILE_UPLOAD_MAX_MEMORY_SIZE,
+            suffix='.akamai',
+            dir=settings.FILE_UPLOAD_TEMP_DIR,
+        )
+        with self._connected():
+            try:
+                if self._full_paths:
+                    self._download(name, file.write)
+                    file.seek(0)
+                else:
+                    pwd = self._connection.pwd()
+                    self._connection.cwd(os.path.dirname(name))
+                    self._connection.retrbinary('RETR ' + os.path.basename(name), file.write)
+                    file.seek(0)
+                    self._connection.cwd(pwd)
+
+                return file
+            except ftplib.all_errors:
+                file.close()
+                raise AkamaiNetStorageException('Error retrieving remote file %s' % name)
+
+    def _download(self, name, callback):
+        """
+        RETR name into callback on the connection of the current thread. When
+        the transfer breaks off it is resumed with REST after the last byte
+        received, up to RETRIES times.
+        """
+        path = self._remote_path(name)
+        received = [0]
+
+        def write(data):
+            callback(data)
+            received[0] += len(data)
+
+        attempt = 0
+        while True:
+            try:
+                self._connection.retrbinary('RETR ' + path, write, rest=received[0] or None)
+                return received[0]
+            except ftplib.all_errors as e:
+                if attempt >= self._retries or not is_transfer_error(e):
+                    raise
+            attempt += 1
+            self.stats.incr('download_resumes')
+            self._wait_before_retry(attempt)
+            self._connection.reconnect()
+
+    def _wait_before_retry(self, attempt):
+        if self._retry_backoff:
+            time.sleep(self._retry_backoff * 2 ** (attempt - 1))
+
+    def read_range(self, name, start, length):
+        """
+        Read length bytes of name from start, transferring only that range.
+        Fewer bytes come back only when the range goes past the end of the
+        file as the server confirmed it (226), a transfer the server ended
+        early is resumed, or raises AkamaiNetStorageException once the
+        retries are used up.
+        """
+        stream = self.open_stream(name, start)
+        try:
+            return stream.read(length)
+        finally:
+            stream.close()
+
+    def _start_transfer(self, name, offset=0):
+        """
+        Start a RETR of name at offset on a connection of its own, returning
+        the connection and its data socket. Finish with _end_transfer().
+        """
+        connection = self._pool.checkout()
+        try:
+            connection.voidcmd('TYPE I')
+            data_socket = connection.transfercmd('RETR ' + self._remote_path(name), offset or None)
+            return connection, data_socket
+        except ftplib.all_errors as e:
+            # A refused RETR leaves the connection usable
+            self._pool.checkin(connection, discard=not isinstance(e, ftplib.error_perm))
             raise AkamaiNetStorageException('Error retrieving remote file %s' % name)
 
-    def _get_dir_details(self, path, recursive=False, show_folders=True, show_files=True):
-        # Connection must be open!
+    def _end_transfer(self, connection, data_socket, complete):
+        """
+        Close the data socket of a transfer started by _start_transfer() and
+        return its connection to the pool. A transfer abandoned before the
+        end is aborted first, see _abort_transfer(). True when the server
+        confirmed a complete transfer.
+        """
+        if not complete:
+            self._pool.checkin(connection, discard=not self._abort_transfer(connection, data_socket))
+            return False
+        data_socket.close()
         try:
-            lines = []
+            connection.voidresp()
+        except (ftplib.error_temp, ftplib.error_perm):
+            # The transfer failed (426), the control connection is in step
+            self._pool.checkin(connection)
+            return False
+        except ftplib.all_errors:
+            complete = False
+        self._pool.checkin(connection, discard=not complete)
+        return complete
 
-            command = 'LIST {options} {path}'.format(**{
-                'options': '' if not recursive else '-R',
-                'path': path,
-            })
+    def _abort_transfer(self, connection, data_socket):
+        """
+        ABOR a transfer before its end and read the two replies left on the
+        control connection: that of the transfer (226 when the server had
+        sent everything already, 426 otherwise) and that of ABOR (225 or 226).
+        False when they do not come as expected within ABORT_TIMEOUT seconds,
+        the connection must not be reused then.
+        """
+        try:
+            connection.putcmd('ABOR')
+            data_socket.close()
+            timeout = connection.sock.gettimeout()
+            connection.sock.settimeout(self._config.get('ABORT_TIMEOUT', 10))
+            reply = connection.getmultiline()
+            if reply[:3] != '225':
+                if reply[:1] not in ('2', '4'):
+                    return False
+                reply = connection.getmultiline()
+                if reply[:3] not in ('225', '226'):
+                    return False
+            connection.sock.settimeout(timeout)
+        except (ftplib.all_errors + (AttributeError, )):
+            return False
+        finally:
+            data_socket.close()
+        self.stats.incr('transfers_aborted')
+        return True
 
-            self._connection.retrlines(command, lines.append)
+    def _get_dir_details(self, path, recursive=False, show_folders=True, show_files=True):
+        dirs = {}
+        files = {}
 
-            dirs = {}
-            files = {}
+        entries = self._iter_tree(path) if recursive else self._iter_listing(path)
+        for entry in entries:
+            # Non recursive listings are keyed by name, recursive ones by path
+            key = entry.path if recursive else entry.name
+            if entry.type == 'dir':
+                if show_folders:
+                    dirs[key] = 0
+            elif entry.type == 'file':
+                if show_files:
+                    files[key] = entry.size
 
-            current_path = os.path.normpath(path)
+        return dirs, files
 
-            for line in lines:
-                if not line:
-                    continue
-                if line.endswith(":"):
-                    current_path = os.path.normpath(line[:-1])
-                    continue
+    def _iter_listing(self, path, recursive=False, sections=None):
+        """
+        Yield an Entry for every object listed in path, parsing the listing
+        while it arrives instead of collecting it first.
 
-                words = line.split()
-                if len(words) < 6:
-                    continue
-                if words[-2] == '->':
-                    continue
+        Servers supporting MLST are asked for MLSD, with exact sizes, types and
+        UTC modification times; LIST -R is used for recursive listings, the
+        directories of its sections are appended to the list sections.
+
+        Inside a _connected() block the listing uses the connection of that
+        block, which must not be used for anything else until the listing is
+        consumed. Otherwise it runs on a connection of its own.
+        """
+        path = self._remote_path(path)
+
+        # Inside a _connected() block use that connection, the pool may be exhausted
+        borrowed = self._connection
+        connection = borrowed or self._pool.checkout()
+
+        if not recursive and 'MLST' in connection.features:
+            command, parse = 'MLSD', iter_mlsd
+        else:
+            command = 'LIST -R' if recursive else 'LIST'
+            parse = functools.partial(iter_list, sections=sections)
+        if path:
+            command += ' ' + path
+
+        try:
+            connection.sendcmd('TYPE A')
+            data_socket = connection.transfercmd(command)
+        except ftplib.all_errors as e:
+            if borrowed is None:
+                self._pool.checkin(connection, discard=not isinstance(e, ftplib.error_perm))
+            raise AkamaiNetStorageException('Error getting listing for %s' % path)
 
-                if show_folders and words[0][0] == 'd':
-                    if not recursive:
-                        dirs[words[-1]] = 0
-                    else:
-                        dirs[os.path.normpath(current_path + '/' + words[-1])] = 0
-                elif show_files and words[0][0] == '-':
-                    if not recursive:
-                        files[words[-1]] = int(words[-5])
-                    else:
-                        files[os.path.normpath(current_path + '/' + words[-1])] = int(words[-5])
-
-            return dirs, files
+        complete = False
+        try:
+            for entry in parse(self._iter_lines(connection, data_socket), path):
+                if entry.type == 'dir':
+                    self._known_dirs.add(entry.path)
+                yield entry
+            complete = True
         except ftplib.all_errors:
             raise AkamaiNetStorageException('Error getting listing for %s' % path)
+        finally:
+            if borrowed is None:
+                self._end_transfer(connection, data_socket, complete)
+            elif complete:
+                data_socket.close()
+                connection.voidresp()
+            elif not self._abort_transfer(connection, data_socket):
+                # The replies of the abandoned transfer may still come
+                connection.reconnect()
+        self._known_dirs.add_tree(path)
+
+    def _iter_lines(self, connection, data_socket):
+        lines = data_socket.makefile('rb')
+        try:
+            for line in lines:
+                if not six.PY2:
+                    line = line.decode(connection.encoding)
+                yield line
+        finally:
+            lines.close()
 
     def _get_dir_extra_details(self, path, recursive=True, ):
-        self._start_connection()
         try:
             command = 'LIST {options} {path}'.format(**{
                 'options': '' if not recursive else '-R',
@@ -252,7 +1358,8 @@ class AkamaiNetStorage(Storage):
 
             lines = []
 
-            self._connection.retrlines(command, lines.append)
+            with self._connected():
+                self._connection.retrlines(command, lines.append)
 
             return lines
 
@@ -260,43 +1367,217 @@ class AkamaiNetStorage(Storage):
             raise AkamaiNetStorageException('Error getting listing for %s' % path)
 
 
-class AkamaiContentFile(File):
-    def __init__(self, file, name, storage):
-        self._storage = storage
-        super(AkamaiContentFile, self).__init__(file, name=name)
+class ObservedReader(object):
+    """
+    Read only file wrapper passing every byte read to observers (e.g. the
+    update() of a hash) exactly once, also when a retried upload rewinds the
+    file and reads a part of it again.
+    """
 
-    def __bool__(self):
-        return True
+    def __init__(self, file, observers):
+        self._file = file
+        self._observers = observers
+        try:
+            self._start = self._position = file.tell()
+        except (AttributeError, IOError, ValueError):
+            self._start = self._position = 0
+        self._observed = self._position
 
-    def __nonzero__(self):      # Python 2 compatibility
-        return type(self).__bool__(self)
+    @property
+    def observed(self):
+        """Number of bytes passed to the observers."""
+        return self._observed - self._start
 
-    def open(self, mode=None):
-        self.seek(0)
+    def read(self, size=-1):
+        data = self._file.read(size)
+        end = self._position + len(data)
+        if end > self._observed:
+            new = data[self._observed - self._position:] if self._position < self._observed else data
+            for observer in self._observers:
+                observer(new)
+            self._observed = end
+        self._position = end
+        return data
 
-    def close(self):
-        pass
+    def tell(self):
+        return self._file.tell()
+
+    def seek(self, offset, whence=os.SEEK_SET):
+        self._file.seek(offset, whence)
+        self._position = self._file.tell()
 
 
 class AkamaiFile(File):
+    """
+    Local copy of a remote file, in memory while small and in a temporary
+    or disk cache file otherwise.
+    """
+
     def __init__(self, file, name, storage):
         self._storage = storage
+        self._mmap = None
         super(AkamaiFile, self).__init__(file, name=name)
 
     def open(self, mode=None):
         if not self.closed:
             self.seek(0)
         elif self.name and self._storage.exists(self.name):
-            self.file = self._storage._retrieve_file(self.name)
+            # name may be a dedup alias, download the object holding it
+            self.file = self._storage._retrieve_file(self._storage._resolve(self.name))
         else:
             raise ValueError("The file cannot be opened.")
 
+    def mmap(self):
+        """
+        Read only mmap of the contents once they are on disk, for slicing
+        without reading the file (memoryview(f.mmap())[a:b] copies nothing
+        on Python 3). Contents still in memory are returned as a memoryview.
+        """
+        if self._mmap is not None:
+            return self._mmap
+        # _retrieve_file() only rolls over beyond FILE_UPLOAD_MAX_MEMORY_SIZE,
+        # fileno() would write smaller contents out
+        in_memory = (isinstance(self.file, SpooledTemporaryFile) and
+                     self.size <= settings.FILE_UPLOAD_MAX_MEMORY_SIZE)
+        if not in_memory and self.size:
+            self._mmap = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+            return self._mmap
+        position = self.file.tell()
+        self.file.seek(0)
+        data = self.file.read()
+        self.file.seek(position)
+        return memoryview(data)
+
+    def close(self):
+        if self._mmap is not None:
+            self._mmap.close()
+            self._mmap = None
+        super(AkamaiFile, self).close()
+
     def _get_size(self):
         if not hasattr(self, '_size'):
-            if hasattr(self.file, 'size'):
-                self._size = self.file.size
-            else:
-                self._size = self._storage.size(self.name)
+            # Measured locally, the contents are all here
+            position = self.file.tell()
+            self.file.seek(0, os.SEEK_END)
+            self._size = self.file.tell()
+            self.file.seek(position)
+        return self._size
+
+    def _set_size(self, size):
+        self._size = size
+
+    size = property(_get_size, _set_size)
+
+
+class AkamaiStreamingFile(File):
+    """
+    Remote file read straight from the data connection of a RETR instead of
+    being downloaded into a local buffer first, so the first bytes are
+    available as soon as the server sends them. Seeking restarts the
+    transfer at the new position with REST.
+
+    The file holds a pooled connection until it is read to the end or closed.
+    """
+
+    def __init__(self, name, storage, offset=0):
+        self._storage = storage
+        self._connection = None
+        self._socket = None
+        self._position = 0
+        super(AkamaiStreamingFile, self).__init__(None, name=name)
+        self.mode = 'rb'
+        self._start(offset)
+
+    def __del__(self):
+        try:
+            self.close()
+        except Exception:
+            pass
+
+    def _start(self, offset):
+        self._connection, self._socket = self._storage._start_transfer(self.name, offset)
+        self.file = self._socket.makefile('rb')
+        self._position = offset
+
+    def _finish(self, complete):
+        """End the transfer, False when a complete one was not confirmed."""
+        if self._socket is None:
+            return True
+        self.file.close()
+        connection, data_socket = self._connection, self._socket
+        self._connection = self._socket = None
+        return self._storage._end_transfer(connection, data_socket, complete)
+
+    def read(self, size=-1):
+        # Nothing read is not the end of the transfer when nothing was asked
+        if self._socket is None or size == 0:
+            return b''
+        if size is None or size < 0:
+            data = self._read_resuming(-1)
+        else:
+            data = self._read_resuming(size)
+        if not data or size is None or size < 0:
+            self._finish(complete=True)
+        return data
+
+    def _read_resuming(self, size):
+        """
+        Read up to size bytes (everything when negative), reopening the
+        transfer at the current position when the data connection breaks.
+        The end of the data is the end of the file only once the server
+        confirms the transfer (226), a server closing the data connection
+        early (426) is resumed as well.
+        """
+        chunks = []
+        attempt = 0
+        while size != 0:
+            try:
+                data = self.file.read(size)
+                if not data and not self._finish(complete=True):
+                    raise EOFError('Transfer of %s ended early' % self.name)
+            except (socket.error, EOFError):
+                if attempt >= self._storage._retries:
+                    self._finish(complete=False)
+                    raise AkamaiNetStorageException('Error retrieving remote file %s' % self.name)
+                attempt += 1
+                self._storage.stats.incr('download_resumes')
+                self._storage._wait_before_retry(attempt)
+                self._finish(complete=False)
+                self._start(self._position)
+                continue
+            if not data:
+                break
+            chunks.append(data)
+            self._position += len(data)
+            if size > 0:
+                size -= len(data)
+        return b''.join(chunks)
+
+    def tell(self):
+        return self._position
+
+    def seek(self, offset, whence=os.SEEK_SET):
+        if whence == os.SEEK_CUR:
+            offset += self._position
+        elif whence == os.SEEK_END:
+            offset += self.size
+        if offset < 0:
+            raise ValueError('Negative seek position %d' % offset)
+        if offset == self._position and self._socket is not None:
+            return offset
+        self._finish(complete=False)
+        self._start(offset)
+        return offset
+
+    def open(self, mode=None):
+        self.seek(0)
+
+    def close(self):
+        self._finish(complete=False)
+
+    def _get_size(self):
+        if not hasattr(self, '_size'):
+            self._size = self._storage.size(self.name)
         return self._size
 
     def _set_size(self, size):
@@ -0,0 +1,554 @@
+"""
+Mirror a NetStorage tree into the FileSystem, Directory and File tables.
+
+The listing is read into memory and diffed against the rows the storage
+already has, fetched in one query. Inserts, updates and deletes are then
+applied in batches with MPTT updates disabled, and the tree is rebuilt
+once at the end instead of on every save().
+
+Every listed directory keeps a fingerprint: its mtime in the parent
+listing, its number of entries and the size of its files. An incremental
+sync walks the tree breadth first and lists the directories whose
+fingerprint is missing or whose mtime changed, each level in parallel on
+pooled connections. The mtime of a directory changes when an entry is
+added to, removed from or renamed in it, never with changes deeper down,
+so every known directory is still looked at: those in an unchanged
+directory with an MLST each instead of a listing, all of them listed on
+servers without MLST. A file rewritten in place leaves the mtime of its
+directory alone and is only seen by a full sync.
+"""
+import itertools
+import posixpath
+import time
+from collections import namedtuple
+
+from akamai.concurrency import ordered_map
+from akamai.forms.fields import invalidate_choices
+from akamai.listing import Entry, normalize
+from akamai.models import Directory, File, FileStorage, FileSystem, SyncRun
+from akamai.utils import get_storage_class
+from django.conf import settings
+from django.contrib.contenttypes.models import ContentType
+from django.db import router, transaction
+from django.db.models import Q
+from django.db.models.query import QuerySet
+from django.utils import timezone
+
+
+SyncResult = namedtuple('SyncResult', ('listed', 'created', 'updated', 'deleted', 'dirs_listed', 'dirs_skipped'))
+
+Fingerprint = namedtuple('Fingerprint', ('mtime', 'entry_count', 'size_sum'))
+
+# Row as read from the database: pk, path, polymorphic_ctype_id, parent_id
+# and the fingerprint of directories, None for files
+Row = namedtuple('Row', ('pk', 'path', 'ctype', 'parent', 'mtime', 'entry_count', 'size_sum'))
+
+
+class TreeSync(object):
+    """
+    Synchronize the rows of one FILE_STORAGES key with its NetStorage tree.
+
+    Only listed directories are authoritative: rows directly in them are
+    created, moved or deleted to match the listing, rows elsewhere are never
+    touched. With dry_run the changes are counted but not written, a row to
+    create only once over the runs of one TreeSync.
+
+    progress, if given, is called with the number of entries listed so far
+    for every entry listed. Without rebuild_tree the MPTT fields are left
+    stale for the caller to rebuild() once after several syncs. A full sync
+    run() with a step callback writes about step_size entries at a time.
+    """
+
+    def __init__(self, storage_key, batch_size=500, concurrency=None, dry_run=False, rebuild_tree=True,
+                 progress=None, step_size=10000):
+        self.storage_key = storage_key
+        self.storage = get_storage_class(storage_key)
+        self.file_storage = FileStorage.objects.get(config_name=storage_key)
+        # Keeps path__in/pk__in under SQLite's 999 variables
+        self.batch_size = batch_size
+        # More listings at once than connections would only wait for the pool
+        self.concurrency = min(concurrency or self.storage._pool.max_size, self.storage._pool.max_size)
+        self.dry_run = dry_run
+        self.rebuild_tree = rebuild_tree
+        self.progress = progress
+        self.step_size = step_size
+        self.using = router.db_for_write(FileSystem)
+        # Rows a dry run counted as created, for the runs after it
+        self._dry_run_created = set()
+        self._ctypes = {
+            'file': ContentType.objects.get_for_model(File, for_concrete_model=False).pk,
+            'dir': ContentType.objects.get_for_model(Directory, for_concrete_model=False).pk,
+        }
+
+    def run(self, path='', recursive=True, incremental=False, entries=None, step=None, synced=()):
+        """
+        Sync path, and everything below it unless recursive is False. An
+        incremental sync is always recursive. Unless this is a dry run the
+        sync is recorded as a SyncRun.
+
+        entries, the result of list(path, recursive=False), spares a non
+        recursive sync listing path again.
+
+        With step, a full recursive sync is written in steps, see
+        run_in_steps(), an interrupted sync then resumes from the
+        directories passed to step, given back as synced.
+        """
+        started = timezone.now()
+        start = time.time()
+        path = normalize(path)
+        rows = self._rows(path)
+
+        if step is not None and recursive and not incremental:
+            result = self.run_in_steps(path, step, synced, rows)
+        else:
+            if incremental:
+                entries, listed, skipped = self.walk(path, rows)
+            elif entries is not None and not recursive:
+                listed = [path]
+                skipped = 0
+            else:
+                listed = set()
+                entries = self.list(path, recursive, listed)
+                skipped = 0
+            result = self.apply(path, entries, listed, rows)._replace(dirs_skipped=skipped)
+
+        if not self.dry_run:
+            SyncRun.objects.using(self.using).create(
+                storage=self.file_storage,
+                path=path,
+                incremental=incremental,
+                started=started,
+                duration=time.time() - start,
+                dirs_listed=result.dirs_listed,
+                dirs_skipped=result.dirs_skipped,
+                created=result.created,
+                updated=result.updated,
+                deleted=result.deleted,
+            )
+        return result
+
+    def list(self, path, recursive=True, listed=None):
+        """
+        Files and directories below path, as a dict of Entry by path. The
+        directories whose contents were listed in full are added to the set
+        listed: path and those a LIST -R output did not leave out.
+        """
+        if listed is None:
+            listed = set()
+        listed.add(path)
+        sections = []
+        entries = {}
+        if recursive:
+            listing = self.storage._iter_tree(path, sections)
+        else:
+            listing = self.storage._iter_listing(path)
+        for entry in listing:
+            if entry.type in self._ctypes:
+                entries[entry.path] = entry
+                if self.progress is not None:
+                    self.progress(len(entries))
+
+        listed.update(sections)
+        if sections and any(entry.type == 'dir' and name not in listed for name, entry in entries.items()):
+            # The output was cut short, maybe in the middle of its last section
+            listed.discard(sections[-1])
+        return entries
+
+    def run_in_steps(self, path, step, synced=(), rows=None):
+        """
+        Sync path and everything below it a step at a time, each written in
+        a transaction of its own: the contents of listed directories, level
+        by level, until they hold step_size entries. step is called with the
+        directories and the SyncResult of every step written.
+
+        The directories in synced were written by an earlier run, along with
+        those leading to them. They are not listed again, the directories
+        found in them that are not synced are listed instead. The tree is
+        rebuilt once at the end.
+        """
+        path = normalize(path)
+        if rows is None:
+            rows = self._rows(path)
+        synced = set(synced)
+        if path in synced:
+            roots = sorted(
+                row.path for row in rows.values()
+                if row.ctype == self._ctypes['dir'] and row.path not in synced
+                and posixpath.dirname(row.path) in synced and row.path.startswith(path + '/' if path else '')
+            )
+        else:
+            roots = [path]
+
+        # Only the rows of a step are looked at while writing it
+        children = {}
+        for row in rows.values():
+            children.setdefault(posixpath.dirname(row.path), []).append(row.path)
+
+        totals = SyncResult(0, 0, 0, 0, 0, 0)
+        for root in roots:
+            listed = set()
+            entries = self.list(root, True, listed)
+            contents = {}
+            for name in entries:
+                contents.setdefault(posixpath.dirname(name), []).append(name)
+            for directories in _steps(listed, contents, self.step_size):
+                names = [name for directory in directories for name in contents.get(directory, ())]
+                # With the directories leading to them, for their parent links
+                step_entries = dict((name, entries[name]) for name in names)
+                for directory in directories:
+                    for ancestor in _ancestors(directory):
+                        if ancestor in entries:
+                            step_entries[ancestor] = entries[ancestor]
+                step_rows = dict(
+                    (name, rows[name]) for name in itertools.chain(
+                        _ancestors(root), directories, step_entries,
+                        itertools.chain.from_iterable(children.get(directory, ()) for directory in directories))
+                    if name in rows
+                )
+                result = self.apply(root, step_entries, directories, step_rows, rebuild=False)
+                result = result._replace(listed=len(names))
+                # The rows written, for the next steps
+                rows.update(self._rows(names=list(step_entries)))
+                totals = SyncResult(*[total + count for total, count in zip(totals, result)])
+                step(directories, result)
+
+        if not self.dry_run and self.rebuild_tree and (totals.created or totals.updated or totals.deleted):
+            self.rebuild()
+        return totals
+
+    def walk(self, path, rows):
+        """
+        List path and, level by level, the directories below it that changed
+        since their fingerprint in rows was taken.
+
+        The mtime of a directory only changes with its own entries, so the
+        known directories in an unchanged one are looked at with an MLST
+        each, level by level as well, and listed in turn when they changed.
+
+        Returns the entries as a dict by path, the directories listed and the
+        number of known directories that were not.
+        """
+        entries = {}
+        listed = [path]
+        unchanged = []
+
+        def descend(entry):
+            if self._changed(rows.get(entry.path), entry):
+                listed.append(entry.path)
+                return True
+            unchanged.append(entry.path)
+            return False
+
+        def add(entry):
+            entries[entry.path] = entry
+            if self.progress is not None:
+                self.progress(len(entries))
+
+        children = {}
+        for row in rows.values():
+            if row.ctype == self._ctypes['dir']:
+                children.setdefault(posixpath.dirname(row.path), []).append(row.path)
+        workers = self.storage._bulk_workers(self.concurrency)
+
+        roots = [path]
+        while roots:
+            for root in roots:
+                for entry in self.storage.walk(root, concurrency=self.concurrency, descend=descend):
+                    if entry.type in self._ctypes:
+                        add(entry)
+
+            roots = []
+            while unchanged:
+                known = [name for parent in unchanged for name in sorted(children.get(parent, ()))]
+                del unchanged[:]
+                for name, entry, error in ordered_map(self.storage._stat_directory, known, workers):
+                    if error is not None:
+                        # Gone or unreachable, its rows are left alone until
+                        # its parent changes
+                        continue
+                    if entry is None:
+                        # No MLST, listed as if it changed
+                        entry = Entry('dir', 0, None, posixpath.basename(name), name)
+                    if entry.type != 'dir':
+                        continue
+                    add(entry)
+                    if descend(entry):
+                        roots.append(name)
+
+        listed_set = set(listed)
+        skipped = sum(
+            1 for row in rows.values()
+            if row.ctype == self._ctypes['dir'] and row.path.startswith(path + '/' if path else '')
+            and row.path not in listed_set
+        )
+        return entries, listed, skipped
+
+    def _changed(self, row, entry):
+        if row is None or row.ctype != self._ctypes['dir'] or row.entry_count is None:
+            return True
+        return entry.mtime is None or _utc(row.mtime) != entry.mtime
+
+    def apply(self, path, entries, listed, rows=None, rebuild=None):
+        """
+        Bring the rows below path in line with entries, the contents of the
+        directories in listed. rows are those of _rows(path), read again when
+        not given. The tree is rebuilt after changes if rebuild, rebuild_tree
+        by default.
+        """
+        if rebuild is None:
+            rebuild = self.rebuild_tree
+        path = normalize(path)
+        ancestors = _ancestors(path)
+        if rows is None:
+            rows = self._rows(path)
+        listed = set(listed)
+        fingerprints = self._fingerprints(entries, listed, rows)
+
+        # The directories leading to path exist, the listing succeeded
+        listed_count = len(entries)
+        entries = dict(entries)
+        for ancestor in ancestors:
+            entries[ancestor] = Entry('dir', 0, None, posixpath.basename(ancestor), ancestor)
+
+        deleted = []
+        kept = {}
+        for row in rows.values():
+            entry = entries.get(row.path)
+            if entry is not None and self._ctypes[entry.type] == row.ctype:
+                kept[row.path] = row
+            elif row.path in ancestors or posixpath.dirname(row.path) in listed:
+                deleted.append(row.pk)
+
+        created = [name for name in entries if name not in kept]
+
+        fingerprint_updates = []
+        for name, fingerprint in fingerprints.items():
+            row = kept.get(name)
+            if row is not None and Fingerprint(_utc(row.mtime), row.entry_count, row.size_sum) != fingerprint:
+                fingerprint_updates.append((row.pk, fingerprint))
+
+        created_count = len(created)
+        pks = dict((name, row.pk) for name, row in kept.items())
+        if self.dry_run:
+            # Stand-in pks, a kept row under a new directory has to move
+            pks.update((name, object()) for name in created)
+            parent_updates = self._parent_updates(kept, pks)
+            # Still missing when an earlier run counted them, like the
+            # directory a run below path starts from
+            created_count = len(set(created) - self._dry_run_created)
+            self._dry_run_created.update(created)
+        else:
+            with transaction.atomic(using=self.using):
+                with FileSystem._tree_manager.disable_mptt_updates():
+                    self._delete(deleted)
+                    self._create(created, entries, pks, fingerprints)
+                    parent_updates = self._parent_updates(kept, pks)
+                    self._update_parents(parent_updates)
+                    self._update_fingerprints(fingerprint_updates)
+                if rebuild and (deleted or created or parent_updates):
+                    self.rebuild()
+            if deleted or created:
+                invalidate_choices(self.storage_key, path)
+
+        updated = set(pk for pk, parent in parent_updates) | set(pk for pk, fingerprint in fingerprint_updates)
+        return SyncResult(listed_count, created_count, len(updated), len(deleted), len(listed), 0)
+
+    def rebuild(self):
+        """Recompute the MPTT fields of the whole tree from the parent links."""
+        with transaction.atomic(using=self.using):
+            FileSystem._tree_manager.rebuild()
+
+    def _fingerprints(self, entries, listed, rows):
+        """Fingerprint of every listed directory, by path."""
+        counts = dict((name, [0, 0]) for name in listed)
+        for name, entry in entries.items():
+            count = counts.get(posixpath.dirname(name))
+            if count is not None:
+                count[0] += 1
+                if entry.type == 'file':
+                    count[1] += entry.size
+
+        fingerprints = {}
+        for name, (entry_count, size_sum) in counts.items():
+            if name in entries:
+                mtime = entries[name].mtime
+            elif name in rows:
+                # Where the sync started, not listed by its parent
+                mtime = _utc(rows[name].mtime)
+            else:
+                mtime = None
+            fingerprints[name] = Fingerprint(mtime, entry_count, size_sum)
+        return fingerprints
+
+    def _rows(self, path='', names=None):
+        """Rows below path and leading to it by path, or those of names."""
+        if names is not None:
+            rows = {}
+            for batch in _batches(names, self.batch_size):
+                rows.update(self._read_rows(Q(path__in=batch)))
+            return rows
+        if path:
+            return self._read_rows(Q(path__in=_ancestors(path)) | Q(path__startswith=path + '/'))
+        return self._read_rows(Q())
+
+    def _read_rows(self, condition):
+        queryset = FileSystem.objects.non_polymorphic().using(self.using).filter(condition, storage=self.file_storage)
+        queryset = queryset.values_list(
+            'pk', 'path', 'polymorphic_ctype_id', 'parent_id',
+            'directory__mtime', 'directory__entry_count', 'directory__size_sum',
+        )
+        return dict((row.path, row) for row in map(Row._make, queryset))
+
+    def _delete(self, pks):
+        # Rows below a deleted directory go with it through the parent FK
+        for batch in _batches(pks, self.batch_size):
+            FileSystem.objects.non_polymorphic().using(self.using).filter(pk__in=batch).delete()
+
+    def _create(self, names, entries, pks, fingerprints):
+        """
+        Insert rows for names, parents first, and add their pks to pks.
+
+        bulk_create() refuses multi-table inheritance, so the FileSystem rows
+        are bulk created, read back for their pks and the File and Directory
+        rows inserted on their own.
+        """
+        opts = FileSystem._mptt_meta
+        names = sorted(names, key=lambda name: name.count('/'))
+        for batch in _batches(names, self.batch_size):
+            # A batch may span two levels, insert one level at a time
+            for level in _levels(batch):
+                rows = []
+                for name in level:
+                    row = FileSystem(
+                        storage=self.file_storage,
+                        path=name,
+                        parent_id=pks.get(posixpath.dirname(name)),
+                        polymorphic_ctype_id=self._ctypes[entries[name].type],
+                    )
+                    for attr in (opts.left_attr, opts.right_attr, opts.tree_id_attr, opts.level_attr):
+                        setattr(row, attr, 0)
+                    rows.append(row)
+                FileSystem.objects.using(self.using).bulk_create(rows)
+
+                pks.update(
+                    FileSystem.objects.non_polymorphic().using(self.using)
+                    .filter(storage=self.file_storage, path__in=level)
+                    .values_list('path', 'pk')
+                )
+
+                files = []
+                directories = []
+                for name in level:
+                    basename = posixpath.basename(name)
+                    if entries[name].type == 'dir':
+                        directory = Directory(filesystem_ptr_id=pks[name], name=basename)
+                        fingerprint = fingerprints.get(name)
+                        if fingerprint is not None:
+                            directory.mtime = _db_time(fingerprint.mtime)
+                            directory.entry_count = fingerprint.entry_count
+                            directory.size_sum = fingerprint.size_sum
+                        directories.append(directory)
+                    else:
+                        filename, ext = posixpath.splitext(basename)
+                        files.append(File(filesystem_ptr_id=pks[name], name=filename, file_ext=ext[1:].lower()))
+                self._insert_children(File, files)
+                self._insert_children(Directory, directories)
+
+    def _insert_children(self, model, objs):
+        # File and Directory inherit FileSystem through a table each, their
+        # bulk_create() raises ValueError for multi-table inheritance and
+        # save() would write the parent row again, with an MPTT update.
+        # _insert() is what bulk_create() runs for its own table: one INSERT
+        # of the child rows alone, their filesystem_ptr_id set already.
+        if objs:
+            model._base_manager._insert(objs, fields=model._meta.local_concrete_fields, using=self.using)
+
+    def _parent_updates(self, kept, pks):
+        """(pk, parent pk) of kept rows whose parent is out of date."""
+        updates = []
+        for name, row in kept.items():
+            parent = pks.get(posixpath.dirname(name))
+            if row.parent != parent:
+                updates.append((row.pk, parent))
+        return updates
+
+    def _update_parents(self, updates):
+        # One UPDATE per new parent, rows tend to move as whole directories
+        by_parent = {}
+        for pk, parent in updates:
+            by_parent.setdefault(parent, []).append(pk)
+        for parent, pks in by_parent.items():
+            for batch in _batches(pks, self.batch_size):
+                FileSystem.objects.using(self.using).filter(pk__in=batch).update(parent=parent)
+
+    def _update_fingerprints(self, updates):
+        fields = Fingerprint._fields
+        directories = [
+            Directory(pk=pk, mtime=_db_time(mtime), entry_count=entry_count, size_sum=size_sum)
+            for pk, (mtime, entry_count, size_sum) in updates
+        ]
+        if hasattr(QuerySet, 'bulk_update'):
+            Directory._base_manager.using(self.using).bulk_update(directories, fields, batch_size=self.batch_size)
+            return
+        # Django before 2.2, an UPDATE per directory
+        for directory in directories:
+            Directory._base_manager.using(self.using).filter(pk=directory.pk).update(
+                **dict((field, getattr(directory, field)) for field in fields)
+            )
+
+
+def _utc(value):
+    """Naive UTC datetime of a DateTimeField value."""
+    if value is not None and timezone.is_aware(value):
+        value = timezone.make_naive(value, timezone.utc)
+    return value
+
+
+def _db_time(value):
+    """DateTimeField value of a naive UTC datetime."""
+    if value is not None and settings.USE_TZ:
+        value = timezone.make_aware(value, timezone.utc)
+    return value
+
+
+def _ancestors(path):
+    """'a/b/c' -> ['a', 'a/b', 'a/b/c'], [] for the root."""
+    if not path:
+        return []
+    parts = path.split('/')
+    return ['/'.join(parts[:index]) for index in range(1, len(parts) + 1)]
+
+
+def _batches(items, size):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def _steps(directories, contents, size):
+    """
+    The directories, level by level, in lists whose contents hold at least
+    size entries but for the last one.
+    """
+    directories = sorted(directories, key=lambda name: (name.count('/'), name))
+    step = []
+    count = 0
+    for directory in directories:
+        step.append(directory)
+        count += len(contents.get(directory, ()))
+        if count >= size:
+            yield step
+            step = []
+            count = 0
+    if step:
+        yield step
+
+
+def _levels(names):
+    level = []
+    for name in names:
+        if level and name.count('/') != level[0].count('/'):
+            yield level
+            level = []
+        level.append(name)
+    if level:
+        yield level
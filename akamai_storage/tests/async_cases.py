@@ -0,0 +1,96 @@
+"""
+Test cases of akamai.async_storage, in a module of their own since their
+syntax is Python 3.5+ only. test_async_storage imports them there.
+"""
+import asyncio
+
+from akamai.async_storage import AsyncAkamaiNetStorage
+from akamai.tests.base import FTPTestCase
+
+
+class AsyncStorageTests(FTPTestCase):
+    config = {'POOL_MAX_SIZE': 2, 'POOL_CHECKOUT_TIMEOUT': 10}
+
+    def setUp(self):
+        super().setUp()
+        self.loop = asyncio.new_event_loop()
+        self.addCleanup(self.loop.close)
+
+    def run_async(self, coroutine):
+        return self.loop.run_until_complete(asyncio.wait_for(coroutine, 30))
+
+    def async_storage(self):
+        storage = AsyncAkamaiNetStorage('test', loop=self.loop)
+        self.addCleanup(lambda: self.run_async(storage.close()))
+        return storage
+
+    def test_operations(self):
+        storage = self.async_storage()
+        self.write('a.txt', b'abc')
+        self.assertTrue(self.run_async(storage.exists('a.txt')))
+        self.assertEqual(self.run_async(storage.size('a.txt')), 3)
+        self.assertEqual(self.run_async(storage.read_range('a.txt', 1, 2)), b'bc')
+
+    def test_times(self):
+        storage = self.async_storage()
+        self.write('a.txt', b'abc')
+        modified = self.run_async(storage.modified_time('a.txt'))
+        self.assertEqual(self.run_async(storage.accessed_time('a.txt')), modified)
+        self.assertEqual(self.run_async(storage.created_time('a.txt')), modified)
+        for getter in (storage.get_accessed_time, storage.get_created_time, storage.get_modified_time):
+            self.assertEqual(self.run_async(getter('a.txt')), storage._storage.get_modified_time('a.txt'))
+
+    def test_more_streams_than_connections(self):
+        storage = self.async_storage()
+        for i in range(6):
+            self.write('%s.bin' % i, str(i).encode() * 200000)
+
+        async def consume(name):
+            chunks = []
+            async with await storage.open_stream(name) as stream:
+                async for chunk in stream:
+                    chunks.append(chunk)
+                    # Let the other consumers in between chunks
+                    await asyncio.sleep(0)
+            return b''.join(chunks)
+
+        async def consume_all():
+            names = ['%s.bin' % i for i in range(6)]
+            # Other operations keep waiting for the connections of the streams
+            return await asyncio.gather(storage.exists('0.bin'), *[consume(name) for name in names])
+
+        results = self.run_async(consume_all())
+        self.assertTrue(results[0])
+        self.assertEqual(results[1:], [str(i).encode() * 200000 for i in range(6)])
+
+    def test_operations_while_holding_a_stream(self):
+        self.configure(POOL_CHECKOUT_TIMEOUT=2)
+        storage = self.async_storage()
+        self.write('a.bin', b'a' * 200000)
+        self.write('b.bin', b'b')
+
+        async def stream_and_check():
+            stream = await storage.open_stream('a.bin')
+            second = asyncio.ensure_future(storage.open_stream('b.bin'))
+            await asyncio.sleep(0.1)
+            # No stream takes the last connection
+            self.assertFalse(second.done())
+            exists = await storage.exists('b.bin')
+            await stream.close()
+            await (await second).close()
+            return exists
+
+        self.assertTrue(self.run_async(stream_and_check()))
+
+    def test_failed_open_frees_the_stream(self):
+        storage = self.async_storage()
+        self.write('a.txt', b'abc')
+        for i in range(3):
+            with self.assertRaises(Exception):
+                self.run_async(storage.open_stream('missing.txt'))
+
+        async def read():
+            async with await storage.open_stream('a.txt') as stream:
+                return await stream.read()
+
+        self.assertEqual(self.run_async(read()), b'abc')
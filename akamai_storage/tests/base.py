@@ -0,0 +1,204 @@
+"""
+Test cases running the storage against a local FTP server.
+
+pyftpdlib is required for them, they are skipped without it. The server
+serves a temporary directory which is emptied before every test, and the
+storage under test is configured as FILE_STORAGES['test'].
+"""
+import itertools
+import logging
+import os
+import re
+import shutil
+import tempfile
+import threading
+import unittest
+
+from akamai.storage import AkamaiNetStorage
+from django.test import TestCase, override_settings
+
+try:
+    from pyftpdlib.authorizers import DummyAuthorizer
+    from pyftpdlib.handlers import FTPHandler
+    from pyftpdlib.servers import ThreadedFTPServer
+except ImportError:
+    ThreadedFTPServer = None
+
+
+USER = 'akamai'
+PASSWORD = 'akamai'
+
+
+class CutProducer(object):
+    """Sends data, then fails the transfer."""
+
+    def __init__(self, data):
+        self.data = data
+
+    def more(self):
+        if self.data is None:
+            raise IOError('Transfer cut')
+        data, self.data = self.data, None
+        return data
+
+
+class FTPServer(object):
+    """
+    pyftpdlib server on a free port of the loopback interface.
+
+    It answers LIST -R like NetStorage, which pyftpdlib does not, with a
+    section per directory below the listed one. Setting list_limit of the
+    handler cuts every LIST -R output after that many lines, setting
+    refuse_stor, a regular expression, refuses to store the files whose
+    name matches it. Setting cut_retr ends the next RETR with a 426 reply
+    after sending that many bytes, as when the data connection breaks off.
+    """
+
+    def __init__(self, root):
+        authorizer = DummyAuthorizer()
+        authorizer.add_user(USER, PASSWORD, root, perm='elradfmwMT')
+
+        class Handler(FTPHandler):
+            list_limit = None
+            recursive = False
+            refuse_stor = None
+            cut_retr = None
+
+            def ftp_RETR(self, file):
+                if self.cut_retr is None:
+                    return FTPHandler.ftp_RETR(self, file)
+                cut, self.__class__.cut_retr = self.cut_retr, None
+                with open(file, 'rb') as f:
+                    f.seek(self._restart_position)
+                    data = f.read(cut)
+                self._restart_position = 0
+                self.push_dtp_data(CutProducer(data), isproducer=True, cmd='RETR')
+                return file
+
+            def ftp_STOR(self, file, mode='w'):
+                if self.refuse_stor is not None and re.search(self.refuse_stor, os.path.basename(file)):
+                    self.respond('550 Refused.')
+                    return
+                return FTPHandler.ftp_STOR(self, file, mode)
+
+            def pre_process_command(self, line, cmd, arg):
+                self.recursive = cmd == 'LIST' and (arg == '-R' or arg.startswith('-R '))
+                if self.recursive:
+                    arg = arg[3:]
+                return FTPHandler.pre_process_command(self, line, cmd, arg)
+
+            def ftp_LIST(self, path):
+                if not self.recursive or not self.fs.isdir(path):
+                    return FTPHandler.ftp_LIST(self, path)
+                data = b''.join(itertools.islice(self._walk(path), self.list_limit))
+                self.push_dtp_data(data, cmd='LIST')
+                return path
+
+            def _walk(self, path):
+                for directory, dirnames, filenames in os.walk(path):
+                    dirnames.sort()
+                    if directory != path:
+                        yield (u'\r\n%s:\r\n' % self.fs.fs2ftp(directory)).encode('utf8')
+                    for line in self.fs.format_list(directory, sorted(dirnames + filenames)):
+                        yield line
+
+        Handler.authorizer = authorizer
+        self.handler = Handler
+        self.server = ThreadedFTPServer(('127.0.0.1', 0), Handler)
+        # Shared by every ThreadedFTPServer otherwise, stopping the server of
+        # one test case would end the sessions of the next one
+        self.server._exit = threading.Event()
+        self.port = self.server.socket.getsockname()[1]
+        self.thread = threading.Thread(target=self.server.serve_forever, kwargs={'timeout': 0.1})
+        self.thread.daemon = True
+
+    def start(self):
+        # pyftpdlib logs every command unless its logger is configured already
+        logger = logging.getLogger('pyftpdlib')
+        logger.setLevel(logging.ERROR)
+        if not logger.handlers:
+            logger.addHandler(logging.NullHandler())
+        self.thread.start()
+
+    def stop(self):
+        self.server.close_all()
+
+
+@unittest.skipIf(ThreadedFTPServer is None, 'pyftpdlib is not installed')
+class FTPTestCase(TestCase):
+    # FILE_STORAGES['test'] settings on top of the server's
+    config = {}
+
+    @classmethod
+    def setUpClass(cls):
+        super(FTPTestCase, cls).setUpClass()
+        cls.root = tempfile.mkdtemp()
+        # pyftpdlib changes the working directory of the process to serve
+        # CWD and fails once it was removed, stay where tests remove nothing
+        cls.cwd = os.getcwd()
+        os.chdir(cls.root)
+        cls.server = FTPServer(cls.root)
+        cls.server.start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.stop()
+        os.chdir(cls.cwd)
+        shutil.rmtree(cls.root, ignore_errors=True)
+        super(FTPTestCase, cls).tearDownClass()
+
+    def setUp(self):
+        for name in os.listdir(self.root):
+            path = os.path.join(self.root, name)
+            if os.path.isdir(path):
+                shutil.rmtree(path)
+            else:
+                os.remove(path)
+        self.configure()
+
+    def configure(self, **config):
+        """Change FILE_STORAGES['test'] for the rest of the test."""
+        settings = {
+            'FILE_STORAGE': 'akamai.storage.AkamaiNetStorage',
+            'HOST': '127.0.0.1',
+            'PORT': self.server.port,
+            'USER': USER,
+            'PASSWORD': PASSWORD,
+            'PATH': '',
+            'MEDIA_URL': 'http://media.example.com/',
+            'RETRY_BACKOFF': 0,
+        }
+        settings.update(self.config)
+        settings.update(config)
+        override = override_settings(FILE_STORAGES={'test': settings})
+        override.enable()
+        self.addCleanup(override.disable)
+
+    def storage(self, **config):
+        if config:
+            self.configure(**config)
+        storage = AkamaiNetStorage('test')
+        self.addCleanup(storage.disconnect)
+        return storage
+
+    def write(self, name, data=b'x'):
+        """Create name on the server, without the storage."""
+        path = os.path.join(self.root, name)
+        if not os.path.isdir(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+        with open(path, 'wb') as f:
+            f.write(data)
+
+    def remove(self, name):
+        path = os.path.join(self.root, name)
+        if os.path.isdir(path):
+            shutil.rmtree(path)
+        else:
+            os.remove(path)
+
+    def read(self, name):
+        with open(os.path.join(self.root, name), 'rb') as f:
+            return f.read()
+
+    def listdir(self, path=''):
+        return sorted(os.listdir(os.path.join(self.root, path)))
@@ -0,0 +1,79 @@
+import threading
+
+from akamai.storage import AkamaiNetStorageException
+from akamai.tests.base import FTPTestCase
+from django.core.files.base import ContentFile
+
+
+class BulkTests(FTPTestCase):
+    config = {'POOL_MAX_SIZE': 4}
+
+    def items(self, count):
+        return [('d/%02d.txt' % index, ContentFile(('%d' % index).encode())) for index in range(count)]
+
+    def test_save_many_in_order(self):
+        storage = self.storage()
+        results = list(storage.save_many(self.items(12), concurrency=3))
+        self.assertEqual([result.name for result in results], ['d/%02d.txt' % index for index in range(12)])
+        self.assertEqual([result.value for result in results], [result.name for result in results])
+        self.assertEqual([result.error for result in results], [None] * 12)
+        self.assertEqual(self.read('d/07.txt'), b'7')
+
+    def test_save_many_errors(self):
+        self.addCleanup(setattr, self.server.handler, 'refuse_stor', None)
+        self.server.handler.refuse_stor = r'^0[35]\.txt$'
+        results = list(self.storage().save_many(self.items(8)))
+        failed = [result.name for result in results if result.error is not None]
+        self.assertEqual(failed, ['d/03.txt', 'd/05.txt'])
+        self.assertIsInstance(results[3].error, AkamaiNetStorageException)
+        # The other items went through
+        self.assertEqual(self.listdir('d'), ['%02d.txt' % index for index in range(8) if index not in (3, 5)])
+
+    def test_open_many(self):
+        for index in range(6):
+            self.write('d/%d.txt' % index, ('%d' % index).encode())
+        names = ['d/%d.txt' % index for index in range(6)] + ['d/missing.txt']
+        results = list(self.storage().open_many(names, concurrency=2))
+        self.assertEqual([result.name for result in results], names)
+        self.assertEqual([result.value.read() for result in results[:6]], [('%d' % index).encode() for index in range(6)])
+        self.assertIsNone(results[6].value)
+        self.assertIsNotNone(results[6].error)
+
+    def test_concurrency_bound(self):
+        storage = self.storage()
+        save = storage.save
+        lock = threading.Lock()
+        active = [0, 0]
+
+        def counted(name, content):
+            with lock:
+                active[0] += 1
+                active[1] = max(active)
+            try:
+                return save(name, content)
+            finally:
+                with lock:
+                    active[0] -= 1
+
+        storage.save = counted
+        list(storage.save_many(self.items(12), concurrency=2))
+        self.assertLessEqual(active[1], 2)
+        self.assertLessEqual(storage.stats['connects'], 2)
+        # Never more than the pool
+        list(storage.save_many(self.items(12), concurrency=10))
+        self.assertLessEqual(active[1], 4)
+        self.assertLessEqual(storage.stats['connects'], 4)
+
+    def test_reads_ahead_a_few_items(self):
+        pulled = []
+
+        def items():
+            for item in self.items(20):
+                pulled.append(item[0])
+                yield item
+
+        results = self.storage().save_many(items(), concurrency=2)
+        next(results)
+        # Twice the workers
+        self.assertLessEqual(len(pulled), 4)
+        self.assertEqual(len(list(results)), 19)
@@ -0,0 +1,92 @@
+import os
+import shutil
+import tempfile
+import time
+import unittest
+from datetime import datetime
+
+from akamai.cache import DiskCache
+from akamai.tests.base import FTPTestCase
+
+
+MTIME = datetime(2020, 1, 1, 12, 0, 0)
+
+
+def writer(data):
+    return lambda f: f.write(data)
+
+
+class DiskCacheTests(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+
+    def read(self, path):
+        with open(path, 'rb') as f:
+            return f.read()
+
+    def test_hit(self):
+        cache = DiskCache(self.directory)
+        self.assertIsNone(cache.get('a.txt', 3, MTIME))
+        path = cache.put('a.txt', 3, MTIME, writer(b'abc'))
+        self.assertEqual(cache.get('a.txt', 3, MTIME), path)
+        self.assertEqual(self.read(path), b'abc')
+        # Found again by a cache on the same directory
+        self.assertEqual(DiskCache(self.directory).get('a.txt', 3, MTIME), path)
+
+    def test_changed_version(self):
+        cache = DiskCache(self.directory)
+        path = cache.put('a.txt', 3, MTIME, writer(b'abc'))
+        self.assertIsNone(cache.get('a.txt', 4, MTIME))
+        self.assertIsNone(cache.get('a.txt', 3, datetime(2020, 1, 2)))
+
+        new_path = cache.put('a.txt', 4, datetime(2020, 1, 2), writer(b'abcd'))
+        # The copy of the previous version is gone
+        self.assertFalse(os.path.exists(path))
+        self.assertEqual((len(cache), cache.size), (1, 4))
+        self.assertEqual(self.read(new_path), b'abcd')
+
+    def test_eviction(self):
+        cache = DiskCache(self.directory, max_bytes=10)
+        for name in ('a', 'b', 'c'):
+            cache.put(name, 4, MTIME, writer(b'1234'))
+            cache.get('a', 4, MTIME)
+        # b was the least recently used
+        self.assertIsNotNone(cache.get('a', 4, MTIME))
+        self.assertIsNone(cache.get('b', 4, MTIME))
+        self.assertIsNotNone(cache.get('c', 4, MTIME))
+        self.assertEqual(cache.size, 8)
+
+    def test_too_large(self):
+        cache = DiskCache(self.directory, max_bytes=10, max_object_bytes=2)
+        self.assertIsNone(cache.put('a', 3, MTIME, writer(b'abc')))
+        self.assertEqual(len(cache), 0)
+
+
+class StorageDiskCacheTests(FTPTestCase):
+
+    def setUp(self):
+        super(StorageDiskCacheTests, self).setUp()
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        self.configure(DISK_CACHE={'DIR': directory})
+        self.write('a.txt', b'abc')
+
+    def test_hit(self):
+        storage = self.storage()
+        self.assertEqual(storage.open('a.txt').read(), b'abc')
+        self.assertEqual(storage.open('a.txt').read(), b'abc')
+        self.assertEqual((storage.stats['disk_cache_misses'], storage.stats['disk_cache_hits']), (1, 1))
+
+    def test_changed_on_the_server(self):
+        storage = self.storage()
+        self.assertEqual(storage.open('a.txt').read(), b'abc')
+        # Same size, another modification time
+        self.write('a.txt', b'xyz')
+        past = time.time() - 3600
+        os.utime(os.path.join(self.root, 'a.txt'), (past, past))
+        self.assertEqual(storage.open('a.txt').read(), b'xyz')
+        self.write('a.txt', b'abcd')
+        self.assertEqual(storage.open('a.txt').read(), b'abcd')
+        self.assertEqual((storage.stats['disk_cache_misses'], storage.stats['disk_cache_hits']), (3, 0))
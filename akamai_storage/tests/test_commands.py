@@ -0,0 +1,99 @@
+import os
+import shutil
+import tempfile
+
+from akamai.models import Directory, FileSystem, SyncRun
+from akamai.sync import TreeSync
+from akamai.tests.test_sync import SyncTestCase
+from django.core.management import CommandError, call_command
+from django.utils.six import StringIO
+
+
+class SyncCommandTests(SyncTestCase):
+
+    def setUp(self):
+        super(SyncCommandTests, self).setUp()
+        self.write('a/f1.txt')
+        self.write('a/b/f2.txt')
+        self.write('c/f3.txt')
+        self.write('g.txt')
+
+    def call(self, *args, **options):
+        stdout = StringIO()
+        call_command('akamai_sync', 'test', *args, stdout=stdout, **options)
+        return stdout.getvalue()
+
+    def test_sync(self):
+        output = self.call()
+        # The directories below the root are updated with their fingerprint
+        self.assertIn('7 entries, 7 created, 2 updated, 0 deleted', output)
+        self.assertEqual(
+            [(directory.path, directory.get_descendant_count()) for directory in Directory.objects.order_by('path')],
+            [('a', 3), ('a/b', 1), ('c', 1)])
+        # The root and one run per directory in it
+        self.assertEqual(SyncRun.objects.count(), 3)
+
+    def test_path(self):
+        self.call('a/')
+        self.assertEqual(sorted(FileSystem.objects.values_list('path', flat=True)), ['a', 'a/b', 'a/b/f2.txt', 'a/f1.txt'])
+
+    def test_dry_run(self):
+        # Each directory below the root counted once
+        output = self.call(dry_run=True)
+        self.assertIn('Dry run: 7 entries, 7 created, 0 updated, 0 deleted', output)
+        self.assertFalse(FileSystem.objects.exists())
+        self.assertFalse(SyncRun.objects.exists())
+
+    def test_interrupted(self):
+        run = TreeSync.run
+
+        def interrupted(sync, path='', *args, **kwargs):
+            if path == 'c':
+                raise KeyboardInterrupt
+            return run(sync, path, *args, **kwargs)
+
+        TreeSync.run = interrupted
+        self.addCleanup(setattr, TreeSync, 'run', run)
+        self.assertRaises(CommandError, self.call)
+        # The tree of what was synced is usable
+        self.assertEqual(Directory.objects.get(path='a').get_descendant_count(), 3)
+
+    def test_resume_inside_a_directory(self):
+        self.write('a/b/d/f4.txt')
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        checkpoint = os.path.join(directory, 'sync.json')
+        listed = []
+        sync_list, apply = TreeSync.list, TreeSync.apply
+
+        def listing(sync, path, *args, **kwargs):
+            listed.append(path)
+            return sync_list(sync, path, *args, **kwargs)
+
+        def interrupted(sync, path, entries, directories, *args, **kwargs):
+            if 'a/b' in directories:
+                raise KeyboardInterrupt
+            return apply(sync, path, entries, directories, *args, **kwargs)
+
+        TreeSync.list = listing
+        self.addCleanup(setattr, TreeSync, 'list', sync_list)
+        TreeSync.apply = interrupted
+        self.addCleanup(setattr, TreeSync, 'apply', apply)
+        self.assertRaises(CommandError, self.call, checkpoint=checkpoint, checkpoint_every=1)
+        self.assertEqual(listed, ['', 'a'])
+        self.assertIn('a/f1.txt', FileSystem.objects.values_list('path', flat=True))
+
+        TreeSync.apply = apply
+        del listed[:]
+        output = self.call(checkpoint=checkpoint, checkpoint_every=1)
+        # What was written before the interruption is not listed again
+        self.assertEqual(listed, ['', 'a/b', 'c'])
+        self.assertIn('9 entries, 9 created', output)
+        self.assertEqual(
+            [(directory.path, directory.get_descendant_count()) for directory in Directory.objects.order_by('path')],
+            [('a', 5), ('a/b', 3), ('a/b/d', 1), ('c', 1)])
+        self.assertEqual([directory.entry_count for directory in Directory.objects.order_by('path')], [2, 2, 1, 1])
+        self.assertFalse(os.path.exists(checkpoint))
+
+    def test_usage(self):
+        self.assertRaises(CommandError, self.call, 'a', 'b')
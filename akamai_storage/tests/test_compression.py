@@ -0,0 +1,82 @@
+import gzip
+import io
+import logging
+
+from akamai.storage import logger
+from akamai.tests.base import FTPTestCase
+from django.core.files.base import ContentFile
+
+
+def gunzip(data):
+    return gzip.GzipFile(fileobj=io.BytesIO(data)).read()
+
+
+class CompressionTests(FTPTestCase):
+    config = {'COMPRESS': {'ENCODINGS': ['gzip']}, 'METADATA_CACHE': {'TIMEOUT': 60}}
+    data = b'compressible ' * 1000
+
+    def test_variant(self):
+        storage = self.storage()
+        storage.save('a.txt', ContentFile(self.data))
+        self.assertEqual(gunzip(self.read('a.txt.gz')), self.data)
+        self.assertEqual(storage.url('a.txt', 'gzip, deflate'), 'http://media.example.com/a.txt.gz')
+        self.assertEqual(storage.url('a.txt', 'br'), 'http://media.example.com/a.txt')
+
+    def test_url_needs_no_round_trip(self):
+        storage = self.storage()
+        storage.save('a.txt', ContentFile(self.data))
+        misses = storage.stats['metadata_cache_misses']
+        self.assertEqual(storage.url('a.txt', 'gzip'), 'http://media.example.com/a.txt.gz')
+        # Only the original was looked up, save() recorded the variant
+        self.assertEqual(storage.stats['metadata_cache_misses'], misses + 1)
+        self.assertEqual(storage.url('a.txt', 'gzip'), 'http://media.example.com/a.txt.gz')
+        self.assertEqual(storage.stats['metadata_cache_misses'], misses + 1)
+
+    def test_no_variant_without_metadata_cache(self):
+        storage = self.storage(METADATA_CACHE=None)
+        storage.save('a.txt', ContentFile(self.data))
+        self.assertEqual(self.listdir(), ['a.txt', 'a.txt.gz'])
+        self.assertEqual(storage.url('a.txt', 'gzip'), 'http://media.example.com/a.txt')
+
+    def test_no_variant_of_a_missing_file(self):
+        storage = self.storage()
+        storage.save('a.txt', ContentFile(self.data))
+        self.remove('a.txt')
+        storage._invalidate('a.txt')
+        self.assertEqual(storage.url('a.txt', 'gzip'), 'http://media.example.com/a.txt')
+
+    def test_defaults(self):
+        for config in (True, {}):
+            self.assertIsNotNone(self.storage(COMPRESS=config)._compress)
+        self.assertIsNone(self.storage(COMPRESS=None)._compress)
+        self.assertIsNone(self.storage(COMPRESS=False)._compress)
+
+    def test_failed_variant_is_removed(self):
+        storage = self.storage()
+        storage.save('a.txt', ContentFile(self.data))
+
+        self.server.handler.refuse_stor = r'\.gz'
+        self.addCleanup(setattr, self.server.handler, 'refuse_stor', None)
+        records = []
+        handler = logging.Handler()
+        handler.emit = records.append
+        logger.addHandler(handler)
+        self.addCleanup(logger.removeHandler, handler)
+        # The original is saved, without the variant of the previous content
+        # nor a temporary file
+        storage.save('a.txt', ContentFile(b'new ' * 1000))
+        self.assertEqual(self.listdir(), ['a.txt'])
+        self.assertEqual(self.read('a.txt'), b'new ' * 1000)
+        self.assertEqual(storage.url('a.txt', 'gzip'), 'http://media.example.com/a.txt')
+        self.assertEqual(storage.stats['compressed_variants_failed'], 1)
+        self.assertEqual(len(records), 1)
+
+        self.server.handler.refuse_stor = None
+        storage.save('a.txt', ContentFile(b'new ' * 1000))
+        self.assertEqual(gunzip(self.read('a.txt.gz')), b'new ' * 1000)
+
+    def test_incompressible(self):
+        storage = self.storage()
+        storage.save('a.txt', ContentFile(self.data))
+        storage.save('a.txt', ContentFile(b'x'))
+        self.assertEqual(self.listdir(), ['a.txt'])
@@ -0,0 +1,70 @@
+from akamai.db.fields import AkamaiFilePathField, path_exists, prefetch_paths, validation_batch
+from akamai.tests.base import FTPTestCase
+from django.core.exceptions import ValidationError
+from django.core.files.base import ContentFile
+
+
+class DedupTests(FTPTestCase):
+    config = {'DEDUP': {'MIN_SIZE': 1}}
+
+    def setUp(self):
+        super(DedupTests, self).setUp()
+        self.storage().save('a/x.txt', ContentFile(b'content'))
+        self.storage().save('b/y.txt', ContentFile(b'content'))
+        self.storage().save('a/w.txt', ContentFile(b'content'))
+
+    def test_alias(self):
+        storage = self.storage()
+        self.assertEqual(self.listdir(), ['a'])
+        self.assertEqual(self.listdir('a'), ['x.txt'])
+        self.assertTrue(storage.exists('b/y.txt'))
+        self.assertEqual(storage.open('b/y.txt').read(), b'content')
+
+    def test_reopen_alias(self):
+        f = self.storage().open('b/y.txt')
+        self.assertEqual(f.read(), b'content')
+        f.close()
+        f.open()
+        self.assertEqual(f.read(), b'content')
+        f.close()
+
+    def test_validation(self):
+        field = AkamaiFilePathField(storage_key='test')
+        field.validate('b/y.txt', None)
+        self.assertRaises(ValidationError, field.validate, 'b/z.txt', None)
+
+    def test_batch_validation(self):
+        names = ['a/x.txt', 'a/w.txt', 'b/y.txt', 'a/z.txt']
+        with validation_batch():
+            prefetch_paths('test', names)
+            # Nothing left to look up
+            with self.assertNumQueries(0):
+                found = [path_exists('test', name) for name in names]
+        self.assertEqual(found, [True, True, True, False])
+
+        with validation_batch():
+            self.assertEqual([path_exists('test', name) for name in names], [True, True, True, False])
+
+    def test_metadata_cache_hit_needs_no_query(self):
+        storage = self.storage(METADATA_CACHE={'TIMEOUT': 60})
+        self.assertEqual(storage.size('b/y.txt'), 7)
+        self.assertTrue(storage.exists('b/y.txt'))
+        with self.assertNumQueries(0):
+            self.assertEqual(storage.size('b/y.txt'), 7)
+            self.assertTrue(storage.exists('b/y.txt'))
+        storage.delete('b/y.txt')
+        self.assertFalse(storage.exists('b/y.txt'))
+        self.assertTrue(storage.exists('a/x.txt'))
+
+    def test_variants_follow_the_object(self):
+        storage = self.storage(COMPRESS={'ENCODINGS': ['gzip']}, METADATA_CACHE={'TIMEOUT': 60})
+        data = b'compressible ' * 1000
+        storage.save('c/x.txt', ContentFile(data))
+        storage.save('d/y.txt', ContentFile(data))
+        self.assertEqual(self.listdir('c'), ['x.txt', 'x.txt.gz'])
+        storage.delete('c/x.txt')
+        self.assertEqual(self.listdir('c'), [])
+        self.assertEqual(self.listdir('d'), ['y.txt', 'y.txt.gz'])
+        self.assertEqual(storage.url('d/y.txt', 'gzip'), 'http://media.example.com/d/y.txt.gz')
+        storage.delete('d/y.txt')
+        self.assertEqual(self.listdir('d'), [])
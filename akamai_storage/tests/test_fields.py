@@ -0,0 +1,58 @@
+import shutil
+import tempfile
+
+from akamai.db.fields import AkamaiFilePathField, path_exists, prefetch_paths, validation_batch
+from akamai.tests.test_sync import SyncTestCase
+from django.core.exceptions import ValidationError
+from django.core.files import storage as django_storage
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage
+from django.test import TestCase
+
+
+class DefaultStorageTests(TestCase):
+
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        wrapped = django_storage.default_storage._wrapped
+        django_storage.default_storage._wrapped = FileSystemStorage(location=directory)
+        self.addCleanup(setattr, django_storage.default_storage, '_wrapped', wrapped)
+        django_storage.default_storage.save('a/x.txt', ContentFile(b'x'))
+
+    def test_validation(self):
+        field = AkamaiFilePathField()
+        field.validate('a/x.txt', None)
+        self.assertRaises(ValidationError, field.validate, 'a/y.txt', None)
+
+    def test_batch_validation(self):
+        with validation_batch():
+            prefetch_paths('default', ['a/x.txt', 'a/y.txt'])
+            self.assertEqual([path_exists('default', name) for name in ('a/x.txt', 'a/y.txt')], [True, False])
+
+
+class DatabaseValidationTests(SyncTestCase):
+    config = {'VALIDATION_SOURCE': 'db'}
+
+    def setUp(self):
+        super(DatabaseValidationTests, self).setUp()
+        self.write('a/x.txt')
+        self.write('a/b/y.txt')
+        self.sync()
+        # The synced rows are the reference, not the server
+        self.remove('a/x.txt')
+        self.write('a/z.txt')
+
+    def test_validation(self):
+        field = AkamaiFilePathField(storage_key='test')
+        field.validate('a/x.txt', None)
+        field.validate('a/b', None)
+        self.assertRaises(ValidationError, field.validate, 'a/z.txt', None)
+
+    def test_batch_validation(self):
+        names = ['a/x.txt', 'a/b/y.txt', 'a/z.txt', 'c/x.txt']
+        with validation_batch():
+            prefetch_paths('test', names)
+            with self.assertNumQueries(0):
+                found = [path_exists('test', name) for name in names]
+        self.assertEqual(found, [True, True, False, False])
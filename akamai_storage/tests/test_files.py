@@ -0,0 +1,43 @@
+import mmap
+import shutil
+import tempfile
+
+from akamai.tests.base import FTPTestCase
+from django.conf import settings
+
+
+class MmapTests(FTPTestCase):
+
+    def test_in_memory(self):
+        self.write('a.bin', b'0123456789')
+        f = self.storage().open('a.bin')
+        view = f.mmap()
+        self.assertIsInstance(view, memoryview)
+        self.assertEqual(view[2:5].tobytes(), b'234')
+        # Still in memory, not written out to get at a file descriptor
+        self.assertEqual(f.read(), b'0123456789')
+        f.close()
+
+    def test_on_disk(self):
+        data = b'0123456789' * (settings.FILE_UPLOAD_MAX_MEMORY_SIZE // 10 + 1)
+        self.write('a.bin', data)
+        f = self.storage().open('a.bin')
+        view = f.mmap()
+        self.assertIsInstance(view, mmap.mmap)
+        self.assertEqual(view[:], data)
+        self.assertIs(f.mmap(), view)
+        f.close()
+
+    def test_disk_cache_copy(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        self.write('a.bin', b'0123456789')
+        f = self.storage(DISK_CACHE={'DIR': directory}).open('a.bin')
+        # Small, but on disk already
+        self.assertIsInstance(f.mmap(), mmap.mmap)
+        self.assertEqual(f.mmap()[2:5], b'234')
+        f.close()
+
+    def test_empty(self):
+        self.write('a.bin', b'')
+        self.assertEqual(self.storage().open('a.bin').mmap().tobytes(), b'')
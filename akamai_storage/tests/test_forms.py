@@ -0,0 +1,60 @@
+from akamai.forms.fields import AkamaiFilePathField, get_choices, invalidate_choices
+from akamai.tests.base import FTPTestCase
+from django.core.cache import caches
+
+
+class ChoicesTests(FTPTestCase):
+
+    def setUp(self):
+        super(ChoicesTests, self).setUp()
+        caches['default'].clear()
+        self.addCleanup(caches['default'].clear)
+        self.write('a/f1.txt')
+        self.write('a/b/f2.txt')
+        self.write('a/b/c/f3.txt')
+
+    def choices(self, path='', recursive=False):
+        names = get_choices(self.storage(), 'test', path, recursive=recursive)
+        return [name for name, label in names]
+
+    def test_field(self):
+        field = AkamaiFilePathField(path='a', storage_key='test', required=False)
+        self.assertEqual(list(field.choices), [('', '---------'), ('f1.txt', 'f1.txt')])
+        field.clean('f1.txt')
+
+    def test_cached(self):
+        self.assertEqual(self.choices('a'), ['f1.txt'])
+        self.write('a/new.txt')
+        self.assertEqual(self.choices('a'), ['f1.txt'])
+        # Shared through the Django cache, not kept by the process
+        caches['default'].clear()
+        self.assertEqual(self.choices('a'), ['f1.txt', 'new.txt'])
+
+    def test_invalidate_path(self):
+        for path in ('', 'a', 'a/b', 'a/b/c'):
+            self.choices(path, recursive=True)
+        self.write('a/b/new.txt')
+        self.write('a/b/c/new.txt')
+        self.write('a/new.txt')
+        invalidate_choices('test', 'a/b')
+        # Above and below a/b
+        self.assertIn('a/b/new.txt', self.choices('', recursive=True))
+        self.assertIn('a/b/new.txt', self.choices('a', recursive=True))
+        self.assertIn('a/b/new.txt', self.choices('a/b', recursive=True))
+        self.assertIn('a/b/c/new.txt', self.choices('a/b/c', recursive=True))
+        # a/new.txt is next to a/b, the listing of a is one above it
+        self.assertIn('a/new.txt', self.choices('', recursive=True))
+
+    def test_invalidate_elsewhere(self):
+        self.write('d/f4.txt')
+        self.assertEqual(self.choices('d'), ['f4.txt'])
+        self.write('d/new.txt')
+        invalidate_choices('test', 'a/b')
+        invalidate_choices('other')
+        self.assertEqual(self.choices('d'), ['f4.txt'])
+
+    def test_invalidate_storage(self):
+        self.assertEqual(self.choices('a'), ['f1.txt'])
+        self.write('a/new.txt')
+        invalidate_choices()
+        self.assertEqual(self.choices('a'), ['f1.txt', 'new.txt'])
@@ -0,0 +1,54 @@
+import os
+import shutil
+import socket
+
+from akamai.storage import AkamaiFTP
+from akamai.tests.base import FTPTestCase
+from django.core.files.base import ContentFile
+
+
+def drop(connection):
+    """Cut the control connection, as a server closing idle sessions does."""
+    connection.sock.shutdown(socket.SHUT_RDWR)
+
+
+class ReconnectTests(FTPTestCase):
+    def test_command_resent_after_drop(self):
+        storage = self.storage()
+        self.write('a.txt', b'abc')
+        with storage._connected() as connection:
+            drop(connection)
+            self.assertEqual(storage._size('a.txt'), 3)
+        self.assertEqual(storage.stats['reconnects'], 1)
+
+    def test_working_directory_restored_after_drop(self):
+        storage = self.storage(FULL_PATH_COMMANDS=False)
+        storage.save('d1/first.txt', ContentFile(b'1'))
+
+        with storage._connected() as connection:
+            def cwd(dirname):
+                resp = AkamaiFTP.cwd(connection, dirname)
+                if dirname == 'd1':
+                    # Between CWD d1 and the STOR relying on it
+                    del connection.cwd
+                    drop(connection)
+                return resp
+
+            connection.cwd = cwd
+            storage.save('d1/second.txt', ContentFile(b'2'))
+
+        self.assertEqual(storage.stats['reconnects'], 1)
+        self.assertEqual(self.listdir(), ['d1'])
+        self.assertEqual(self.read('d1/second.txt'), b'2')
+
+    def test_command_not_resent_elsewhere_when_restore_fails(self):
+        storage = self.storage(FULL_PATH_COMMANDS=False)
+        self.write('d1/a.txt')
+        with storage._connected() as connection:
+            connection.cwd('d1')
+            # pyftpdlib answers CWD from inside the directory, let it leave first
+            connection.voidcmd('NOOP')
+            shutil.rmtree(os.path.join(self.root, 'd1'))
+            drop(connection)
+            self.assertRaises(Exception, connection.storbinary, 'STOR b.txt', ContentFile(b'b'))
+        self.assertEqual(self.listdir(), [])
@@ -0,0 +1,101 @@
+from datetime import datetime
+
+from akamai.listing import Entry, ListParser, iter_list, iter_mlsd, parse_time
+from django.test import SimpleTestCase
+
+
+NOW = datetime(2014, 3, 1, 12, 0)
+
+
+class ListParserTests(SimpleTestCase):
+
+    def parse(self, line, path=''):
+        return ListParser(path, NOW).parse(line)
+
+    def test_file(self):
+        self.assertEqual(
+            self.parse('-rw-r--r--   1 owner group     1234 Feb 27 10:30 a file.txt\r\n', 'd'),
+            Entry('file', 1234, datetime(2014, 2, 27, 10, 30), 'a file.txt', 'd/a file.txt'),
+        )
+
+    def test_without_group(self):
+        self.assertEqual(
+            self.parse('drwxr-xr-x 2 owner 4096 Jan 03  2012 dir'),
+            Entry('dir', 4096, datetime(2012, 1, 3), 'dir', 'dir'),
+        )
+
+    def test_odd_owner_and_mode(self):
+        entry = self.parse('-rw-r--r--+  1 ow\xe9n@x g-r.p  5 Mar  1 09:00 f')
+        self.assertEqual((entry.size, entry.name), (5, 'f'))
+
+    def test_link(self):
+        entry = self.parse('lrwxrwxrwx 1 owner group 7 Feb 27 10:30 link -> target')
+        self.assertEqual((entry.type, entry.name), ('link', 'link'))
+
+    def test_time_in_the_future_is_last_year(self):
+        # A day of slack for the timezone of the server
+        self.assertEqual(self.parse('-rw-r--r-- 1 o g 1 Mar  2 10:00 f').mtime, datetime(2014, 3, 2, 10, 0))
+        self.assertEqual(self.parse('-rw-r--r-- 1 o g 1 Dec 24 10:00 f').mtime, datetime(2013, 12, 24, 10, 0))
+
+    def test_ignored_lines(self):
+        for line in ('', 'total 24', 'drwxr-xr-x 2 o g 4096 Jan 03 2012 .',
+                     'drwxr-xr-x 2 o g 4096 Jan 03 2012 ..', '-rw-r--r-- 1 o g x Jan 03 2012 f',
+                     '-rw-r--r-- 1 o g'):
+            self.assertIsNone(self.parse(line), line)
+
+    def test_bad_date(self):
+        self.assertIsNone(self.parse('-rw-r--r-- 1 o g 1 Feb 30 10:00 f').mtime)
+
+    def test_recursive_sections(self):
+        lines = [
+            '-rw-r--r-- 1 o g 1 Jan 03 2012 f0',
+            'drwxr-xr-x 2 o g 0 Jan 03 2012 a',
+            '',
+            'd/a:',
+            'drwxr-xr-x 2 o g 0 Jan 03 2012 b',
+            'drwxr-xr-x 2 o g 0 Jan 03 2012 c',
+            '',
+            './d/a/b:',
+            'total 0',
+            '',
+            'd/a/c:',
+            '-rw-r--r-- 1 o g 1 Jan 03 2012 f1',
+        ]
+        sections = []
+        entries = list(iter_list(lines, 'd', NOW, sections))
+        self.assertEqual([entry.path for entry in entries], ['d/f0', 'd/a', 'd/a/b', 'd/a/c', 'd/a/c/f1'])
+        # The empty d/a/b has a section, only the listed path has none
+        self.assertEqual(sections, ['d/a', 'd/a/b', 'd/a/c'])
+
+    def test_truncated_recursive_listing(self):
+        lines = [
+            'drwxr-xr-x 2 o g 0 Jan 03 2012 a',
+            '',
+            'a:',
+            'drwxr-xr-x 2 o g 0 Jan 03 2012 b',
+        ]
+        sections = []
+        self.assertEqual([entry.path for entry in iter_list(lines, '', NOW, sections)], ['a', 'a/b'])
+        self.assertEqual(sections, ['a'])
+
+
+class MLSDTests(SimpleTestCase):
+
+    def test_entries(self):
+        lines = [
+            'type=cdir;modify=20140101000000; .',
+            'type=pdir;modify=20140101000000; ..',
+            'Type=File;Size=5;Modify=20141026120000.123;UNIX.mode=0644; a name.txt\r\n',
+            'type=dir;modify=20141026120000; sub',
+            'type=OS.unix=slink:/target;modify=bad; link',
+            'type=file;size=1',
+        ]
+        self.assertEqual(list(iter_mlsd(lines, '/d')), [
+            Entry('file', 5, datetime(2014, 10, 26, 12), 'a name.txt', 'd/a name.txt'),
+            Entry('dir', 0, datetime(2014, 10, 26, 12), 'sub', 'd/sub'),
+            Entry('link', 0, None, 'link', 'd/link'),
+        ])
+
+    def test_parse_time(self):
+        self.assertEqual(parse_time('20141026120000.5'), datetime(2014, 10, 26, 12, 0, 0, 500000))
+        self.assertEqual(parse_time(' 20141026120000\r\n'), datetime(2014, 10, 26, 12))
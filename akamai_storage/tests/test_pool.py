@@ -0,0 +1,103 @@
+import threading
+import time
+
+from akamai.pool import ConnectionPool, ConnectionPoolTimeout
+from akamai.tests.base import FTPTestCase
+from django.test import SimpleTestCase
+
+
+class FakeConnection(object):
+    def __init__(self):
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+class ConnectionPoolTests(SimpleTestCase):
+    def pool(self, **kwargs):
+        self.created = []
+
+        def factory():
+            connection = FakeConnection()
+            self.created.append(connection)
+            return connection
+
+        return ConnectionPool(factory, **kwargs)
+
+    def test_reuses_checked_in_connections(self):
+        pool = self.pool(max_size=2)
+        connection = pool.checkout()
+        pool.checkin(connection)
+        self.assertIs(pool.checkout(), connection)
+        self.assertEqual(len(self.created), 1)
+
+    def test_checkout_timeout(self):
+        pool = self.pool(max_size=1, checkout_timeout=0.05)
+        pool.checkout()
+        self.assertRaises(ConnectionPoolTimeout, pool.checkout)
+
+    def test_checkout_waits_for_checkin(self):
+        pool = self.pool(max_size=1, checkout_timeout=5)
+        connection = pool.checkout()
+        timer = threading.Timer(0.05, pool.checkin, (connection, ))
+        timer.start()
+        self.assertIs(pool.checkout(), connection)
+        timer.join()
+
+    def test_discarded_connection_frees_room(self):
+        pool = self.pool(max_size=1, checkout_timeout=0.05)
+        connection = pool.checkout()
+        pool.checkin(connection, discard=True)
+        self.assertTrue(connection.closed)
+        self.assertIsNot(pool.checkout(), connection)
+
+    def test_idle_timeout(self):
+        pool = self.pool(max_size=1, idle_timeout=0.01)
+        connection = pool.checkout()
+        pool.checkin(connection)
+        time.sleep(0.05)
+        self.assertIsNot(pool.checkout(), connection)
+        self.assertTrue(connection.closed)
+
+    def test_failed_probe_drops_connection(self):
+        pool = self.pool(max_size=1, probe=lambda connection: False, probe_after=0)
+        connection = pool.checkout()
+        pool.checkin(connection)
+        time.sleep(0.01)
+        self.assertIsNot(pool.checkout(), connection)
+        self.assertTrue(connection.closed)
+
+    def test_failed_connect_frees_room(self):
+        def factory():
+            raise IOError('refused')
+
+        pool = ConnectionPool(factory, max_size=1, checkout_timeout=0.05)
+        self.assertRaises(IOError, pool.checkout)
+        self.assertRaises(IOError, pool.checkout)
+
+
+class StorageConnectionTests(FTPTestCase):
+    def test_connection_reused_across_calls(self):
+        storage = self.storage()
+        self.write('a.txt', b'abc')
+        self.assertTrue(storage.exists('a.txt'))
+        self.assertEqual(storage.size('a.txt'), 3)
+        self.assertEqual(storage.stats['connects'], 1)
+
+    def test_threads_get_connections_of_their_own(self):
+        storage = self.storage(POOL_MAX_SIZE=2)
+        self.write('a.txt')
+        seen = []
+
+        def worker():
+            with storage._connected() as connection:
+                seen.append(connection)
+                time.sleep(0.05)
+
+        threads = [threading.Thread(target=worker) for _ in range(2)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertIsNot(seen[0], seen[1])
@@ -0,0 +1,87 @@
+from akamai.storage import AkamaiNetStorageException
+from akamai.tests.base import FTPTestCase
+
+
+class StreamingFileTests(FTPTestCase):
+    def setUp(self):
+        super(StreamingFileTests, self).setUp()
+        self.write('a.bin', b'0123456789')
+
+    def test_read_in_chunks(self):
+        stream = self.storage().open_stream('a.bin')
+        self.assertEqual(stream.read(3), b'012')
+        self.assertEqual(stream.read(), b'3456789')
+        self.assertEqual(stream.read(3), b'')
+
+    def test_read_nothing_keeps_the_transfer(self):
+        stream = self.storage().open_stream('a.bin')
+        self.assertEqual(stream.read(3), b'012')
+        self.assertEqual(stream.read(0), b'')
+        self.assertEqual(stream.read(3), b'345')
+        stream.close()
+
+    def test_seek_restarts_at_offset(self):
+        stream = self.storage().open_stream('a.bin', 2)
+        self.assertEqual(stream.read(2), b'23')
+        stream.seek(7)
+        self.assertEqual(stream.read(), b'789')
+        self.assertEqual(stream.tell(), 10)
+
+    def test_transfer_ended_early_resumes(self):
+        self.addCleanup(setattr, self.server.handler, 'cut_retr', None)
+        self.server.handler.cut_retr = 4
+        storage = self.storage()
+        stream = storage.open_stream('a.bin')
+        self.assertEqual(stream.read(), b'0123456789')
+        self.assertEqual(storage.stats['download_resumes'], 1)
+        self.assertEqual(storage.stats['connects'], 1)
+
+    def test_transfer_ended_early_fails(self):
+        self.addCleanup(setattr, self.server.handler, 'cut_retr', None)
+        self.server.handler.cut_retr = 4
+        stream = self.storage(RETRIES=0).open_stream('a.bin')
+        self.assertEqual(stream.read(2), b'01')
+        self.assertRaises(AkamaiNetStorageException, stream.read)
+
+
+class RangeReadTests(FTPTestCase):
+    def test_range_reads_reuse_the_connection(self):
+        self.write('a.bin', b'0123456789')
+        storage = self.storage()
+        self.assertEqual(storage.read_range('a.bin', 2, 3), b'234')
+        self.assertEqual(storage.read_range('a.bin', 0, 1), b'0')
+        self.assertEqual(storage.read_range('a.bin', 8, 5), b'89')
+        self.assertEqual(storage.stats['connects'], 1)
+
+    def test_transfer_ended_early(self):
+        self.write('a.bin', b'0123456789')
+        self.addCleanup(setattr, self.server.handler, 'cut_retr', None)
+        self.server.handler.cut_retr = 2
+        storage = self.storage()
+        self.assertEqual(storage.read_range('a.bin', 2, 5), b'23456')
+        self.assertEqual(storage.stats['download_resumes'], 1)
+
+        self.server.handler.cut_retr = 2
+        storage = self.storage(RETRIES=0)
+        self.assertRaises(AkamaiNetStorageException, storage.read_range, 'a.bin', 2, 5)
+        self.assertEqual(storage.read_range('a.bin', 8, 5), b'89')
+
+    def test_abort_during_transfer(self):
+        # Larger than the socket buffers, the server is still sending
+        data = b'0123456789' * 500000
+        self.write('big.bin', data)
+        storage = self.storage()
+        for start in (0, 1000, 4000000):
+            self.assertEqual(storage.read_range('big.bin', start, 10), data[start:start + 10])
+        self.assertEqual(storage.stats['connects'], 1)
+        self.assertEqual(storage.stats['transfers_aborted'], 3)
+        self.assertEqual(storage.size('big.bin'), len(data))
+
+    def test_abandoned_listing_keeps_the_connection(self):
+        for index in range(50):
+            self.write('d/%02d.txt' % index)
+        storage = self.storage()
+        with storage._connected():
+            next(storage._iter_listing('d'))
+            self.assertTrue(storage.exists('d/00.txt'))
+        self.assertEqual(storage.stats['reconnects'], 0)
@@ -0,0 +1,100 @@
+import os
+import time
+
+from akamai.models import Directory, File, FileStorage, FileSystem
+from akamai.sync import TreeSync
+from akamai.tests.base import FTPTestCase
+
+
+class SyncTestCase(FTPTestCase):
+
+    def setUp(self):
+        super(SyncTestCase, self).setUp()
+        FileStorage.objects.create(name='Test', config_name='test')
+
+    def sync(self, path='', **options):
+        incremental = options.pop('incremental', False)
+        return TreeSync('test', **options).run(path, incremental=incremental)
+
+    def paths(self):
+        return sorted(FileSystem.objects.values_list('path', flat=True))
+
+
+class FullSyncTests(SyncTestCase):
+
+    def test_mirror(self):
+        self.write('a/b/f1.txt')
+        self.write('a/c.txt')
+        result = self.sync()
+        self.assertEqual(self.paths(), ['a', 'a/b', 'a/b/f1.txt', 'a/c.txt'])
+        self.assertEqual((result.created, result.deleted, result.dirs_listed), (4, 0, 3))
+        self.assertEqual(File.objects.get(path='a/b/f1.txt').parent, Directory.objects.get(path='a/b'))
+
+        self.write('a/b/f2.txt')
+        self.remove('a/c.txt')
+        result = self.sync()
+        self.assertEqual(self.paths(), ['a', 'a/b', 'a/b/f1.txt', 'a/b/f2.txt'])
+        self.assertEqual((result.created, result.deleted), (1, 1))
+
+    def test_truncated_listing_deletes_nothing_unlisted(self):
+        self.write('a/b/f1.txt')
+        self.write('a/b/f2.txt')
+        self.write('a/c/g.txt')
+        self.write('a/0.txt')
+        self.sync()
+        self.addCleanup(setattr, self.server.handler, 'list_limit', None)
+
+        self.remove('a/0.txt')
+        # The section of a arrives, maybe not all of it, those of a/b and
+        # a/c do not
+        self.server.handler.list_limit = 4
+        result = self.sync()
+        self.assertEqual(self.paths(), [
+            'a', 'a/0.txt', 'a/b', 'a/b/f1.txt', 'a/b/f2.txt', 'a/c', 'a/c/g.txt'])
+        self.assertEqual((result.deleted, result.dirs_listed), (0, 1))
+
+        # Half the section of a/b arrives, all of the one of a
+        self.server.handler.list_limit = 6
+        result = self.sync()
+        self.assertEqual(self.paths(), ['a', 'a/b', 'a/b/f1.txt', 'a/b/f2.txt', 'a/c', 'a/c/g.txt'])
+        self.assertEqual((result.deleted, result.dirs_listed), (1, 2))
+
+    def test_parallel_walk(self):
+        self.configure(PARALLEL_WALK=True)
+        self.write('a/b/f1.txt')
+        self.write('a/c.txt')
+        result = self.sync()
+        self.assertEqual(self.paths(), ['a', 'a/b', 'a/b/f1.txt', 'a/c.txt'])
+        self.assertEqual(result.dirs_listed, 3)
+
+
+class IncrementalSyncTests(SyncTestCase):
+
+    def touch(self, name, days_ago):
+        when = time.time() - days_ago * 86400
+        os.utime(os.path.join(self.root, name), (when, when))
+
+    def test_deep_change(self):
+        self.write('a/b/c/f1.txt')
+        self.write('a/x.txt')
+        for name in ('a', 'a/b', 'a/b/c'):
+            self.touch(name, 10)
+        result = self.sync(incremental=True)
+        self.assertEqual(self.paths(), ['a', 'a/b', 'a/b/c', 'a/b/c/f1.txt', 'a/x.txt'])
+        self.assertEqual((result.dirs_listed, result.dirs_skipped), (4, 0))
+
+        # Only the mtime of a/b/c changes
+        self.write('a/b/c/f2.txt')
+        self.remove('a/b/c/f1.txt')
+        self.touch('a/b/c', 5)
+        result = self.sync(incremental=True)
+        self.assertEqual(self.paths(), ['a', 'a/b', 'a/b/c', 'a/b/c/f2.txt', 'a/x.txt'])
+        self.assertEqual((result.created, result.deleted), (1, 1))
+        self.assertEqual((result.dirs_listed, result.dirs_skipped), (2, 2))
+        self.assertEqual(File.objects.get(path='a/b/c/f2.txt').parent, Directory.objects.get(path='a/b/c'))
+        self.assertEqual(Directory.objects.get(path='a/b').get_children().get().path, 'a/b/c')
+
+        # The fingerprint of a/b/c was updated
+        result = self.sync(incremental=True)
+        self.assertEqual((result.created, result.deleted, result.updated), (0, 0, 0))
+        self.assertEqual((result.dirs_listed, result.dirs_skipped), (1, 3))
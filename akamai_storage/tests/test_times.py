@@ -0,0 +1,53 @@
+import os
+import time
+from datetime import datetime
+
+from akamai.tests.base import FTPTestCase
+from django.test import override_settings
+from django.utils import timezone
+
+
+class TimeTests(FTPTestCase):
+
+    def setUp(self):
+        super(TimeTests, self).setUp()
+        self.write('a.txt')
+        # Whole seconds, MLST and MDTM carry no more
+        self.timestamp = int(time.time()) - 3600
+        os.utime(os.path.join(self.root, 'a.txt'), (self.timestamp, self.timestamp))
+
+    def test_local_times(self):
+        storage = self.storage()
+        local = datetime.fromtimestamp(self.timestamp)
+        self.assertEqual(storage.modified_time('a.txt'), local)
+        # Neither is tracked by the server, both are the last modification
+        self.assertEqual(storage.accessed_time('a.txt'), local)
+        self.assertEqual(storage.created_time('a.txt'), local)
+
+    @override_settings(USE_TZ=True)
+    def test_aware_times(self):
+        storage = self.storage()
+        utc = datetime.utcfromtimestamp(self.timestamp).replace(tzinfo=timezone.utc)
+        for getter in (storage.get_modified_time, storage.get_accessed_time, storage.get_created_time):
+            value = getter('a.txt')
+            self.assertTrue(timezone.is_aware(value))
+            self.assertEqual(value, utc)
+
+    @override_settings(USE_TZ=False)
+    def test_naive_times(self):
+        storage = self.storage()
+        local = datetime.fromtimestamp(self.timestamp)
+        for getter in (storage.get_modified_time, storage.get_accessed_time, storage.get_created_time):
+            self.assertEqual(getter('a.txt'), local)
+
+    def test_without_mlst(self):
+        storage = self.storage()
+        with storage._connected():
+            storage._connection.features.pop('MLST', None)
+            self.assertEqual(storage._modified_time('a.txt'), datetime.utcfromtimestamp(self.timestamp))
+
+    def test_metadata_cache(self):
+        storage = self.storage(METADATA_CACHE={'TIMEOUT': 60})
+        first = storage.get_modified_time('a.txt')
+        self.assertEqual(storage.get_accessed_time('a.txt'), first)
+        self.assertEqual(storage.stats['metadata_cache_hits'], 1)
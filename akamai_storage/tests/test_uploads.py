@@ -0,0 +1,70 @@
+import socket
+from io import BytesIO
+
+from akamai.storage import AkamaiNetStorageException
+from akamai.tests.base import FTPTestCase
+from django.core.files.base import ContentFile, File
+
+
+class FlakyFile(object):
+    """File whose reads break off at the given offsets, once each."""
+
+    def __init__(self, data, failures):
+        self._file = BytesIO(data)
+        self._failures = list(failures)
+        self.closed = False
+
+    def read(self, size=-1):
+        position = self._file.tell()
+        if self._failures and position + max(size, 0) >= self._failures[0]:
+            self._failures.pop(0)
+            raise socket.error('Connection reset by peer')
+        return self._file.read(size)
+
+    def seek(self, offset, whence=0):
+        return self._file.seek(offset, whence)
+
+    def tell(self):
+        return self._file.tell()
+
+    def close(self):
+        self.closed = True
+
+
+class UploadTests(FTPTestCase):
+    data = b'0123456789' * 100000
+
+    def test_save_and_open(self):
+        storage = self.storage()
+        storage.save('a/b/c.txt', ContentFile(b'abc'))
+        self.assertEqual(self.read('a/b/c.txt'), b'abc')
+        self.assertEqual(storage.open('a/b/c.txt').read(), b'abc')
+
+    def test_retry_starts_over(self):
+        storage = self.storage(RETRIES=2)
+        storage.save('a.bin', File(FlakyFile(self.data, [300000])))
+        self.assertEqual(self.read('a.bin'), self.data)
+        self.assertEqual(storage.stats['upload_retries'], 1)
+
+    def test_resumable_upload_appends(self):
+        storage = self.storage(RETRIES=2, RESUMABLE_UPLOADS=True)
+        storage.save('a.bin', File(FlakyFile(self.data, [300000])))
+        self.assertEqual(self.read('a.bin'), self.data)
+        self.assertEqual(storage.stats['upload_retries'], 1)
+        # Only what had not arrived yet was sent again
+        self.assertLess(storage.stats['upload_bytes_resent'], 300000)
+        self.assertEqual(self.listdir(), ['a.bin'])
+
+    def test_failed_resumable_upload_leaves_nothing(self):
+        storage = self.storage(RETRIES=1, RESUMABLE_UPLOADS=True)
+        flaky = File(FlakyFile(self.data, [300000, 500000]))
+        self.assertRaises(AkamaiNetStorageException, storage.save, 'a.bin', flaky)
+        self.assertEqual(self.listdir(), [])
+        # The storage is still usable
+        storage.save('b.txt', ContentFile(b'b'))
+        self.assertEqual(self.listdir(), ['b.txt'])
+
+    def test_verified_upload(self):
+        storage = self.storage(VERIFY_UPLOADS='size')
+        storage.save('a.bin', ContentFile(self.data))
+        self.assertEqual(storage.stats['upload_verified'], 1)
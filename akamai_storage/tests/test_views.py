@@ -0,0 +1,82 @@
+import json
+
+from akamai.forms.fields import AkamaiFilePathField
+from akamai.forms.widgets import AkamaiPathAutocomplete
+from akamai.tests.test_sync import SyncTestCase
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.core.urlresolvers import reverse
+from django.test import override_settings
+
+
+# staff_member_required sends others to the admin login
+@override_settings(ROOT_URLCONF='akamai.tests.urls')
+class PathSearchTests(SyncTestCase):
+
+    def setUp(self):
+        super(PathSearchTests, self).setUp()
+        caches['default'].clear()
+        self.addCleanup(caches['default'].clear)
+        for index in range(1, 26):
+            self.write('a/f%02d.txt' % index)
+        self.write('a/g.txt')
+        self.write('a/g.bin')
+        self.write('a/b/h.txt')
+        self.sync()
+        staff = User.objects.create_user('staff', password='secret')
+        staff.is_staff = True
+        staff.save()
+        User.objects.create_user('user', password='secret')
+        self.client.login(username='staff', password='secret')
+
+    def field(self, **options):
+        field = AkamaiFilePathField(storage_key='test', widget=AkamaiPathAutocomplete, **options)
+        return field.widget.render('path', '').split('data-akamai-field="')[1].split('"')[0]
+
+    def search(self, field, **params):
+        params['field'] = field
+        response = self.client.get(reverse('akamai_path_search'), params)
+        self.assertEqual(response.status_code, 200)
+        return json.loads(response.content.decode('utf8'))
+
+    def names(self, field, **params):
+        return [result['id'] for result in self.search(field, **params)['results']]
+
+    def test_staff_only(self):
+        field = self.field(path='a')
+        self.client.logout()
+        self.assertEqual(self.client.get(reverse('akamai_path_search'), {'field': field}).status_code, 302)
+        self.client.login(username='user', password='secret')
+        self.assertEqual(self.client.get(reverse('akamai_path_search'), {'field': field}).status_code, 302)
+
+    def test_signed_field(self):
+        field = self.field(path='a')
+        url = reverse('akamai_path_search')
+        self.assertEqual(self.client.get(url).status_code, 400)
+        self.assertEqual(self.client.get(url, {'field': field[:-1] + 'x'}).status_code, 400)
+        self.assertEqual(self.client.get(url, {'field': field, 'page': 'x'}).status_code, 400)
+
+    def test_paging(self):
+        for source in ('storage', 'db'):
+            field = self.field(path='a', source=source)
+            first = self.search(field, q='f')
+            self.assertEqual([result['id'] for result in first['results']], ['f%02d.txt' % index for index in range(1, 21)])
+            self.assertEqual((first['page'], first['more']), (1, True))
+            second = self.search(field, q='f', page=2)
+            self.assertEqual([result['id'] for result in second['results']], ['f%02d.txt' % index for index in range(21, 26)])
+            self.assertEqual((second['page'], second['more']), (2, False))
+            self.assertEqual(self.names(field, q='f', page_size=3, page=3), ['f07.txt', 'f08.txt', 'f09.txt'])
+
+    def test_listing_search(self):
+        field = self.field(path='a', allow_folders=True)
+        self.assertEqual(self.names(field, q='g'), ['g.bin', 'g.txt'])
+        self.assertEqual(self.names(field, q='b'), ['b'])
+        self.assertEqual(self.names(field, q='z'), [])
+
+    def test_db_search(self):
+        field = self.field(path='a', source='db', match=r'\.txt$')
+        self.assertEqual(self.names(field, q='g'), ['g.txt'])
+        self.assertEqual(self.names(field, q='f', page_size=2, page=2), ['f03.txt', 'f04.txt'])
+        # Recursive choices are paths
+        field = self.field(path='a', source='db', recursive=True)
+        self.assertEqual(self.names(field, q='a/b/'), ['a/b/h.txt'])
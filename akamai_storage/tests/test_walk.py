@@ -0,0 +1,81 @@
+import itertools
+import os
+import shutil
+import time
+
+from akamai.storage import AkamaiNetStorageException
+from akamai.tests.base import FTPTestCase
+
+
+class WalkTests(FTPTestCase):
+
+    def setUp(self):
+        super(WalkTests, self).setUp()
+        self.write('a/1.txt')
+        self.write('a/b/2.txt')
+        self.write('a/b/c/3.txt')
+        self.write('d/4.txt')
+
+    def walk(self, **options):
+        return [entry.path for entry in self.storage().walk(**options)]
+
+    def test_breadth_first(self):
+        paths = self.walk()
+        self.assertEqual(sorted(paths), ['a', 'a/1.txt', 'a/b', 'a/b/2.txt', 'a/b/c', 'a/b/c/3.txt', 'd', 'd/4.txt'])
+        depths = [path.count('/') for path in paths]
+        self.assertEqual(depths, sorted(depths))
+
+    def test_max_depth(self):
+        self.assertEqual(sorted(self.walk(max_depth=1)), ['a', 'd'])
+        self.assertEqual(sorted(self.walk(max_depth=2)), ['a', 'a/1.txt', 'a/b', 'd', 'd/4.txt'])
+
+    def test_max_entries(self):
+        self.assertEqual(len(self.walk(max_entries=3)), 3)
+        self.assertEqual(len(self.walk(max_entries=100)), 8)
+
+    def test_descend(self):
+        paths = self.walk(descend=lambda entry: entry.name != 'a')
+        self.assertEqual(sorted(paths), ['a', 'd', 'd/4.txt'])
+
+    def test_onerror(self):
+        def descend(entry):
+            if entry.name == 'a':
+                # Gone by the time it is listed
+                shutil.rmtree(os.path.join(self.root, 'a'))
+            return True
+
+        errors = []
+        paths = self.walk(descend=descend, onerror=errors.append)
+        self.assertEqual(sorted(paths), ['a', 'd', 'd/4.txt'])
+        self.assertEqual(len(errors), 1)
+        self.assertIsInstance(errors[0], AkamaiNetStorageException)
+
+        self.write('a/1.txt')
+        self.assertRaises(AkamaiNetStorageException, self.walk, descend=descend)
+
+    def test_stop_while_listing(self):
+        for index in range(20):
+            self.write('e/%02d/x.txt' % index)
+        storage = self.storage(POOL_MAX_SIZE=2)
+        list_directory = storage._list_directory
+        listed = []
+
+        def counted(path):
+            listed.append(path)
+            # Still busy when the consumer stops
+            time.sleep(0.05)
+            return list_directory(path)
+
+        storage._list_directory = counted
+        walk = storage.walk('e')
+        # The 20 directories, then the first file
+        self.assertEqual(len(list(itertools.islice(walk, 21))), 21)
+        walk.close()
+
+        deadline = time.time() + 5
+        while len(storage._pool._idle) < storage._pool._size and time.time() < deadline:
+            time.sleep(0.01)
+        # Every connection is back in the pool, the queued listings were dropped
+        self.assertEqual(len(storage._pool._idle), storage._pool._size)
+        self.assertLess(len(listed), 10)
+        self.assertTrue(storage.exists('e/00/x.txt'))
@@ -0,0 +1,7 @@
+from akamai import views
+from django.conf.urls import url
+
+
+urlpatterns = [
+    url(r'^paths/$', views.path_search, name='akamai_path_search'),
+]
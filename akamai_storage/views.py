@@ -1,3 +1,84 @@
-from django.shortcuts import render
+from __future__ import unicode_literals
 
-# Create your views here.
+import re
+from bisect import bisect_left
+
+from akamai.forms.fields import db_paths, get_choices
+from akamai.forms.widgets import SEARCH_SALT
+from akamai.listing import join
+from akamai.utils import get_storage_class
+from django.contrib.admin.views.decorators import staff_member_required
+from django.core import signing
+from django.http import HttpResponseBadRequest, JsonResponse
+
+
+PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
+
+@staff_member_required
+def path_search(request):
+    """
+    Choices of an AkamaiFilePathField starting with the q parameter, one page
+    at a time, as {"results": [{"id": ..., "text": ...}], "page": 1,
+    "more": false}. The field is identified by the signed field parameter
+    rendered by AkamaiPathAutocomplete.
+    """
+    try:
+        params = signing.loads(request.GET.get('field', ''), salt=SEARCH_SALT)
+        page = max(1, int(request.GET.get('page', 1)))
+        page_size = min(MAX_PAGE_SIZE, max(1, int(request.GET.get('page_size', PAGE_SIZE))))
+    except (signing.BadSignature, ValueError):
+        return HttpResponseBadRequest('Invalid search')
+
+    prefix = request.GET.get('q', '')
+    offset = (page - 1) * page_size
+    # One more than the page tells if there is a next one
+    if params['source'] == 'db':
+        names = _search_db(params, prefix, offset, page_size + 1)
+    else:
+        names = _search_listing(params, prefix, offset, page_size + 1)
+
+    return JsonResponse({
+        'results': [{'id': name, 'text': name} for name in names[:page_size]],
+        'page': page,
+        'more': len(names) > page_size,
+    })
+
+
+def _search_db(params, prefix, offset, limit):
+    """Indexed prefix search on FileSystem.path."""
+    paths = db_paths(params['storage_key'], params['path'], params['recursive'],
+                     params['allow_files'], params['allow_folders'])
+    recursive = params['recursive']
+    # Recursive choices are paths, others names in path
+    paths = paths.filter(path__startswith=prefix if recursive else join(params['path'], prefix)).order_by('path')
+    if params['match'] is None:
+        paths = paths[offset:offset + limit]
+    else:
+        match_re = re.compile(params['match'])
+
+    names = []
+    for path in paths.iterator():
+        name = path if recursive else path.rpartition('/')[2]
+        if params['match'] is not None:
+            if not match_re.search(name):
+                continue
+            if offset:
+                offset -= 1
+                continue
+        names.append(name)
+        if len(names) == limit:
+            break
+    return names
+
+
+def _search_listing(params, prefix, offset, limit):
+    """Prefix search on the cached, sorted listing of the field."""
+    choices = get_choices(get_storage_class(params['storage_key']), **params)
+    names = []
+    for name, label in choices[bisect_left(choices, (prefix, )) + offset:]:
+        if not name.startswith(prefix) or len(names) == limit:
+            break
+        names.append(name)
+    return names
@@ -0,0 +1,50 @@
+"""
+Parse a synthetic directory listing with akamai_storage.listing.
+
+    python benchmarks/listing.py [lines]
+
+Lines are generated on the fly and consumed by the incremental parsers, so
+memory stays flat whatever the number of lines (1M by default).
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+
+from akamai_storage.listing import iter_list, iter_mlsd  # noqa: E402
+
+
+def list_lines(count):
+    for index in range(count):
+        if index % 1000 == 0:
+            yield ''
+            yield 'uploads/{:04d}:'.format(index // 1000)
+            yield 'total {}'.format(index)
+        if index % 50 == 0:
+            yield 'drwxr-xr-x   2 web-owner  web-group     4096 Oct 12 10:{:02d} dir{}'.format(index % 60, index)
+        else:
+            yield '-rw-r--r--   1 web-owner  web-group  {:>8} Dec 30  2013 file{}.jpg'.format(index * 7, index)
+
+
+def mlsd_lines(count):
+    for index in range(count):
+        if index % 50 == 0:
+            yield 'type=dir;modify=20141026120000; dir{}'.format(index)
+        else:
+            yield 'type=file;size={};modify=20141026120000.123; file{}.jpg'.format(index * 7, index)
+
+
+def run(label, entries, count):
+    started = time.time()
+    parsed = 0
+    for _ in entries:
+        parsed += 1
+    elapsed = time.time() - started
+    print('{:<5} {:>9} entries in {:6.2f}s, {:>10,.0f} lines/s'.format(label, parsed, elapsed, count / elapsed))
+
+
+if __name__ == '__main__':
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    run('LIST', iter_list(list_lines(count)), count)
+    run('MLSD', iter_mlsd(mlsd_lines(count)), count)
@@ -21,6 +21,8 @@ setup(
     requires = [
         "Django (>=1.7)",
     ],
+    # akamai_storage.async_storage, and its test cases, need Python 3.5+,
+    # nothing imports them on older interpreters
     classifiers=[
         'Development Status :: 3 - Alpha',
         'Environment :: Web Environment',
@@ -31,6 +33,7 @@ setup(
         'Programming Language :: Python',
         'Programming Language :: Python :: 2.7',
         'Programming Language :: Python :: 3.3',
+        'Programming Language :: Python :: 3.5',
         'Topic :: Internet :: WWW/HTTP',
         'Topic :: Internet :: WWW/HTTP :: Dynamic Content',
         'Topic :: Software Development :: Libraries :: Application Frameworks',